@@ -0,0 +1,172 @@
+import asyncio
+import base64
+import json
+import time
+from collections import Counter
+
+from .mock_server import MockAPNSServer, _Protocol
+
+
+class Fault:
+
+    # Sends GOAWAY on all the open connections at `at` and closes them.
+    KIND_GOAWAY = 'goaway'
+
+    # Drops all the open connections at `at`, with their streams in flight.
+    KIND_RESET = 'reset'
+
+    # Connections opened during the fault get no TLS handshake until it ends.
+    KIND_TLS_STALL = 'tls_stall'
+
+    # Pushes with a provider token issued before the fault started get ExpiredProviderToken until it ends.
+    KIND_EXPIRED_TOKEN = 'expired_token'
+
+    # Pushes get Shutdown until the fault ends.
+    KIND_SHUTDOWN = 'shutdown'
+
+    KINDS = (KIND_GOAWAY, KIND_RESET, KIND_TLS_STALL, KIND_EXPIRED_TOKEN, KIND_SHUTDOWN)
+
+    # Faults which happen once at `at`, the others last `duration` seconds.
+    INSTANT_KINDS = (KIND_GOAWAY, KIND_RESET)
+
+    def __init__(self, kind, at, duration=0.0):
+        super().__init__()
+
+        if kind not in self.KINDS:
+            raise ValueError(f'Unknown fault: {kind}')
+
+        # Seconds after FaultInjectingAPNSServer.start_faults().
+        self.kind = kind
+        self.at = at
+        self.duration = duration
+
+    @property
+    def end(self):
+        return self.at + self.duration
+
+    def __repr__(self):
+        return f'<Fault {self.kind} at {self.at}s for {self.duration}s>'
+
+
+class FaultInjectingAPNSServer(MockAPNSServer):
+
+    # A MockAPNSServer which follows a schedule of faults, see Fault. The schedule starts with
+    # start_faults(), until then the server behaves normally.
+
+    def __init__(self, faults=(), **kwargs):
+        super().__init__(**kwargs)
+
+        self.faults = list(faults)
+
+        # Successful pushes by device token. They are counted when the request is received, so a
+        # push whose response got lost with its connection counts as delivered, like on APNs.
+        self.deliveries = Counter()
+
+        # The number of TLS handshakes delayed by a KIND_TLS_STALL fault.
+        self.stalled_handshakes = 0
+
+        # When the schedule was started, by time.monotonic() and time.time().
+        self.started_at = None
+        self._started_time = None
+
+    def start_faults(self):
+        # Starts the schedule, the faults' `at` are relative to now. Returns the time.monotonic() start.
+        self._started_time = time.time()
+        self.started_at = time.monotonic()
+        for fault in self.faults:
+            if fault.kind in Fault.INSTANT_KINDS:
+                self._loop.call_soon_threadsafe(self._loop.call_later, fault.at, self._inject, fault)
+        return self.started_at
+
+    def get_active_fault(self, kind):
+        if self.started_at is None:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        for fault in self.faults:
+            if fault.kind == kind and fault.at <= elapsed < fault.end:
+                return fault
+        return None
+
+    def get_handshake_delay(self):
+        fault = self.get_active_fault(Fault.KIND_TLS_STALL)
+        if fault is None:
+            return 0.0
+        return self.started_at + fault.end - time.monotonic()
+
+    def get_response(self, method, path, headers, body):
+        reason, status_code = super().get_response(method=method, path=path, headers=headers, body=body)
+        if reason is not None:
+            return reason, status_code
+
+        if self.get_active_fault(Fault.KIND_SHUTDOWN) is not None:
+            return 'Shutdown', 503
+        fault = self.get_active_fault(Fault.KIND_EXPIRED_TOKEN)
+        if fault is not None and self._get_issued_at(headers) < self._started_time + fault.at:
+            return 'ExpiredProviderToken', 403
+
+        self.deliveries[path[len('/3/device/'):]] += 1
+        return None, 200
+
+    def _inject(self, fault):
+        for protocol in list(self._protocols):
+            if not isinstance(protocol, _Protocol):
+                continue
+            if fault.kind == Fault.KIND_GOAWAY:
+                protocol.close()
+            else:
+                protocol.abort()
+
+    def _create_server(self, ssl_context):
+        # TLS is started by the protocol instead of the server, so handshakes can be stalled.
+        return self._loop.create_server(lambda: _StallingTLSProtocol(self, ssl_context), host=self.host, port=self.port)
+
+    @staticmethod
+    def _get_issued_at(headers):
+        # The `iat` claim of the provider token, the signature isn't checked.
+        try:
+            payload = headers['authorization'].split()[1].split('.')[1]
+            return json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['iat']
+        except (KeyError, IndexError, ValueError):
+            return 0
+
+
+class _StallingTLSProtocol(asyncio.Protocol):
+
+    # Accepts the TCP connection and starts TLS on it, after a KIND_TLS_STALL fault if one is active.
+    # Nothing is read meanwhile, the ClientHello waits in the socket buffer.
+
+    def __init__(self, server, ssl_context):
+        super().__init__()
+
+        self._server = server
+        self._ssl_context = ssl_context
+        self._transport = None
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server._protocols.add(self)
+        transport.pause_reading()
+
+        delay = self._server.get_handshake_delay()
+        if delay > 0:
+            self._server.stalled_handshakes += 1
+        self._server._start_task(self._start_tls(delay))
+
+    def close(self):
+        self._transport.abort()
+
+    async def _start_tls(self, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        protocol = _Protocol(self._server)
+        try:
+            if self._transport.is_closing():
+                return
+            transport = await self._server._loop.start_tls(self._transport, protocol, self._ssl_context, server_side=True)
+        except (OSError, asyncio.TimeoutError):
+            self._transport.abort()
+            return
+        finally:
+            self._server._protocols.discard(self)
+        protocol.connection_made(transport)
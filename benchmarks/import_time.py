@@ -0,0 +1,60 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+
+# Usage, from the repository root:
+#
+#   python -m benchmarks.import_time --budget 60
+#
+# Imports pyapns_client in fresh interpreters and exits with status 1 if the median import time is
+# over the budget, or if one of the modules only the clients need got imported with it.
+
+
+# Only imported when a client is used (or, for asyncio, when an async API is).
+LAZY_MODULES = ('httpx', 'httpcore', 'h2', 'jwt', 'cryptography', 'asyncio', 'pytz')
+
+SCRIPT = '''
+import json, sys, time
+start_time = time.perf_counter()
+import pyapns_client
+elapsed = time.perf_counter() - start_time
+print(json.dumps({'seconds': elapsed, 'modules': [name for name in %r if name in sys.modules]}))
+''' % (LAZY_MODULES,)
+
+
+def measure(runs):
+    timings = []
+    modules = set()
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', SCRIPT], check=True, capture_output=True, text=True).stdout
+        data = json.loads(output)
+        timings.append(data['seconds'])
+        modules.update(data['modules'])
+    return timings, sorted(modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks the import time of pyapns_client against a budget.')
+    parser.add_argument('--budget', type=float, default=60.0, help='milliseconds for the median import')
+    parser.add_argument('--runs', type=int, default=7)
+    options = parser.parse_args()
+
+    timings, modules = measure(options.runs)
+    median = statistics.median(timings) * 1000
+    print(f'import pyapns_client: median {median:.1f} ms, min {min(timings) * 1000:.1f} ms over {options.runs} runs (budget {options.budget:.1f} ms)')
+
+    failed = False
+    if median > options.budget:
+        print(f'Over the budget by {median - options.budget:.1f} ms.')
+        failed = True
+    if modules:
+        print(f'Imported eagerly: {", ".join(modules)}.')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
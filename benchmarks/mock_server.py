@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import json
+import os
+import random
+import ssl
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+import h2.settings
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+
+# Status codes of the APNs reasons the mock server can answer with.
+REASON_STATUS_CODES = {
+    'BadDeviceToken': 400,
+    'MissingProviderToken': 403,
+    'ExpiredProviderToken': 403,
+    'BadPath': 404,
+    'MethodNotAllowed': 405,
+    'Unregistered': 410,
+    'PayloadTooLarge': 413,
+    'TooManyRequests': 429,
+    'InternalServerError': 500,
+    'ServiceUnavailable': 503,
+    'Shutdown': 503,
+}
+
+
+class MockAPNSServer:
+
+    # A local stand-in for APNs speaking HTTP/2 over TLS (h2 via ALPN). It answers POST
+    # /3/device/{token} like APNs does, after `latency` seconds (plus up to `jitter` seconds),
+    # with errors picked at random from `errors`, a {reason: probability} dict. Runs on its own
+    # event loop thread, use it as a context manager.
+
+    MAX_PAYLOAD_SIZE = 5120
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, errors=None, max_concurrent_streams=1000, seed=None):
+        super().__init__()
+
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.errors = dict(errors or {})
+        self.max_concurrent_streams = max_concurrent_streams
+
+        # Responses by reason ('Success' for 200), and the number of accepted connections.
+        self.responses = Counter()
+        self.connections = 0
+
+        self._random = random.Random(seed)
+        self._directory = None
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._protocols = set()
+        self._tasks = set()
+
+    @property
+    def url(self):
+        return f'https://{self.host}:{self.port}'
+
+    @property
+    def cert_path(self):
+        return os.path.join(self._directory.name, 'cert.pem')
+
+    @property
+    def auth_key_path(self):
+        # A provider token signing key the clients can use, any key is accepted.
+        return os.path.join(self._directory.name, 'auth_key.p8')
+
+    def start(self):
+        self._directory = tempfile.TemporaryDirectory(prefix='pyapns_client_mock_')
+        ssl_context = self._create_ssl_context()
+
+        started = threading.Event()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, args=(ssl_context, started), name='mock_apns_server', daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._thread = None
+        self._directory.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def get_response(self, method, path, headers, body):
+        # Returns a (reason, status_code) tuple, reason is None on success. Override to script responses.
+        if not path.startswith('/3/device/'):
+            return 'BadPath', 404
+        if method != 'POST':
+            return 'MethodNotAllowed', 405
+        if not path[len('/3/device/'):]:
+            return 'BadDeviceToken', 400
+        if 'authorization' not in headers:
+            return 'MissingProviderToken', 403
+        if len(body) > self.MAX_PAYLOAD_SIZE:
+            return 'PayloadTooLarge', 413
+
+        value = self._random.random()
+        for reason, probability in self.errors.items():
+            if value < probability:
+                return reason, REASON_STATUS_CODES[reason]
+            value -= probability
+        return None, 200
+
+    def get_delay(self):
+        if not self.jitter:
+            return self.latency
+        return self.latency + self._random.random() * self.jitter
+
+    def _run(self, ssl_context, started):
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(self._create_server(ssl_context))
+        self.port = self._server.sockets[0].getsockname()[1]
+        started.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def _create_server(self, ssl_context):
+        return self._loop.create_server(lambda: _Protocol(self), host=self.host, port=self.port, ssl=ssl_context)
+
+    async def _close(self):
+        self._server.close()
+        for protocol in list(self._protocols):
+            protocol.close()
+        # Responses still waiting for their delay are dropped with their connections.
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._server.wait_closed()
+
+    def _start_task(self, coroutine):
+        # Runs a coroutine on the server's loop, cancelled when the server stops.
+        task = asyncio.ensure_future(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _create_ssl_context(self):
+        key = ec.generate_private_key(ec.SECP256R1())
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, self.host)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        alternative_names = [x509.DNSName('localhost')]
+        try:
+            alternative_names.append(x509.IPAddress(ipaddress.ip_address(self.host)))
+        except ValueError:
+            alternative_names.append(x509.DNSName(self.host))
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName(alternative_names), critical=False)
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+            .sign(key, hashes.SHA256())
+        )
+
+        key_path = os.path.join(self._directory.name, 'key.pem')
+        with open(key_path, 'wb') as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+        with open(self.cert_path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+        with open(self.auth_key_path, 'wb') as f:
+            auth_key = ec.generate_private_key(ec.SECP256R1())
+            f.write(auth_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+        ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_context.load_cert_chain(self.cert_path, key_path)
+        ssl_context.set_alpn_protocols(['h2'])
+        return ssl_context
+
+
+class _Protocol(asyncio.Protocol):
+
+    def __init__(self, server):
+        super().__init__()
+
+        self._server = server
+        self._connection = h2.connection.H2Connection(config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self._transport = None
+        self._requests = {}
+
+    def connection_made(self, transport):
+        self._transport = transport
+        self._server.connections += 1
+        self._server._protocols.add(self)
+        self._connection.initiate_connection()
+        self._connection.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: self._server.max_concurrent_streams})
+        self._flush()
+
+    def connection_lost(self, exc):
+        self._server._protocols.discard(self)
+        self._transport = None
+
+    def close(self):
+        # Sends GOAWAY and closes the connection. h2 can't send responses after GOAWAY, so the
+        # streams in flight are left unanswered.
+        if self._transport is not None:
+            self._connection.close_connection()
+            self._flush()
+            self._transport.close()
+
+    def abort(self):
+        # Drops the TCP connection without answering the streams in flight.
+        if self._transport is not None:
+            self._transport.abort()
+
+    def data_received(self, data):
+        try:
+            events = self._connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self._flush()
+            self._transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self._requests[event.stream_id] = (dict(event.headers), bytearray())
+            elif isinstance(event, h2.events.DataReceived):
+                self._requests[event.stream_id][1].extend(event.data)
+                self._connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self._requests.pop(event.stream_id)
+                self._server._start_task(self._respond(event.stream_id, headers, bytes(body)))
+            elif isinstance(event, h2.events.StreamReset):
+                self._requests.pop(event.stream_id, None)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self._transport.close()
+        self._flush()
+
+    async def _respond(self, stream_id, headers, body):
+        reason, status_code = self._server.get_response(method=headers.get(':method'), path=headers.get(':path', ''), headers=headers, body=body)
+
+        delay = self._server.get_delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        self._server.responses[reason or 'Success'] += 1
+        self._send_response(stream_id, reason, status_code)
+
+    def _send_response(self, stream_id, reason, status_code):
+        if self._transport is None:
+            return
+
+        response_headers = [(':status', str(status_code)), ('apns-id', str(uuid.uuid4()).upper())]
+        response_body = None
+        if reason is not None:
+            data = {'reason': reason}
+            if reason == 'Unregistered':
+                data['timestamp'] = int(time.time() * 1000)
+            response_body = json.dumps(data).encode()
+            response_headers += [('content-type', 'application/json'), ('content-length', str(len(response_body)))]
+
+        try:
+            self._connection.send_headers(stream_id, response_headers, end_stream=response_body is None)
+            if response_body is not None:
+                self._connection.send_data(stream_id, response_body, end_stream=True)
+        except (h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError):
+            return
+        self._flush()
+
+    def _flush(self):
+        data = self._connection.data_to_send()
+        if data and self._transport is not None:
+            self._transport.write(data)
+
+
+def parse_errors(values):
+    # Parses ['Unregistered=0.01', ...] into {'Unregistered': 0.01, ...}.
+    errors = {}
+    for value in values or ():
+        reason, _, probability = value.partition('=')
+        if reason not in REASON_STATUS_CODES:
+            raise ValueError(f'Unknown reason: {reason}')
+        errors[reason] = float(probability)
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a local HTTP/2 APNs stand-in.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra seconds before every response')
+    parser.add_argument('--error', action='append', metavar='REASON=PROBABILITY', help='e.g. Unregistered=0.01, can be repeated')
+    parser.add_argument('--max-concurrent-streams', type=int, default=1000)
+    args = parser.parse_args()
+
+    server = MockAPNSServer(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter, errors=parse_errors(args.error), max_concurrent_streams=args.max_concurrent_streams)
+    with server:
+        print(f'Listening on {server.url}')
+        print(f'Root certificate: {server.cert_path}')
+        print(f'Auth key: {server.auth_key_path}')
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
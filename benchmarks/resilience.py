@@ -0,0 +1,133 @@
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from pyapns_client import APNSClient, MetricsCollector
+
+from .fault_server import Fault, FaultInjectingAPNSServer
+from .run import get_device_tokens, get_notification, get_percentile
+
+
+# Usage, from the repository root:
+#
+#   python -m benchmarks.resilience --rate 200 --duration 6
+#   python -m benchmarks.resilience --scenario tls_stall --connect-timeout 0.5 --json
+#
+# Every scenario pushes to distinct device tokens at a steady rate from worker threads sharing one
+# APNSClient, while the FaultInjectingAPNSServer follows the scenario's fault schedule. The server
+# runs in process, so the server's and the client's clocks are the same.
+
+
+SCENARIOS = {
+    'goaway': [Fault(Fault.KIND_GOAWAY, at=2.0)],
+    'reset': [Fault(Fault.KIND_RESET, at=2.0)],
+    'tls_stall': [Fault(Fault.KIND_RESET, at=2.0), Fault(Fault.KIND_TLS_STALL, at=2.0, duration=2.0)],
+    'expired_token': [Fault(Fault.KIND_EXPIRED_TOKEN, at=2.0, duration=1.0)],
+    'shutdown': [Fault(Fault.KIND_SHUTDOWN, at=2.0, duration=1.0)],
+}
+
+
+def run_scenario(name, faults, options):
+    metrics = MetricsCollector()
+    with FaultInjectingAPNSServer(faults=faults, latency=options.latency, seed=0) as server:
+        client = APNSClient(mode=APNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='RESILIENCE', team_id='RESILIENCE', connections=options.connections, connect_timeout=options.connect_timeout, metrics=metrics, base_url=server.url)
+        try:
+            client.connect()
+            records = send_at_rate(client, server, options)
+        finally:
+            client.close()
+
+        return summarize(name, faults, server, client, metrics, records)
+
+
+def send_at_rate(client, server, options):
+    # Returns a (device_token, sent_at, completed_at, result) tuple per push, by time.monotonic().
+    notification = get_notification().compile()
+    records = []
+    lock = threading.Lock()
+
+    def push(device_token, sent_at):
+        result = client.try_push(notification=notification, device_token=device_token)
+        with lock:
+            records.append((device_token, sent_at, time.monotonic(), result))
+
+    start_time = server.start_faults()
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        for index, device_token in enumerate(get_device_tokens(round(options.duration * options.rate))):
+            sent_at = start_time + index / options.rate
+            delay = sent_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(push, device_token, sent_at)
+    return records
+
+
+def get_recovery_time(records, fault_time):
+    # Seconds from the fault until the first successful push sent after it completed.
+    completions = [completed_at for _, sent_at, completed_at, result in records if sent_at >= fault_time and result.is_success]
+    if not completions:
+        return None
+    return min(completions) - fault_time
+
+
+def summarize(name, faults, server, client, metrics, records):
+    failures = Counter(result.reason or result.exception_class.__name__ for _, _, _, result in records if not result.is_success)
+    fault_time = server.started_at + min(fault.at for fault in faults)
+    latencies = sorted(result.latency for _, sent_at, _, result in records if sent_at >= fault_time)
+    p99 = get_percentile(latencies, 99)
+    recovery_time = get_recovery_time(records, fault_time)
+    return {
+        'scenario': name,
+        'faults': [{'kind': fault.kind, 'at': fault.at, 'duration': fault.duration} for fault in faults],
+        'pushes': len(records),
+        'succeeded': sum(1 for _, _, _, result in records if result.is_success),
+        'failures': dict(failures),
+        # Never received by the server, whatever the client reported.
+        'lost': sum(1 for device_token, _, _, _ in records if not server.deliveries[device_token]),
+        # Received by the server more than once, e.g. retried after the connection dropped the response.
+        'duplicated': sum(1 for device_token, _, _, _ in records if server.deliveries[device_token] > 1),
+        # Received by the server, but the client reported a failure.
+        'unacknowledged': sum(1 for device_token, _, _, result in records if server.deliveries[device_token] and not result.is_success),
+        'connection_resets': metrics.connection_resets,
+        'server_connections': server.connections,
+        'stalled_handshakes': server.stalled_handshakes,
+        'retries': client.retry_stats.to_dict(),
+        'recovery_seconds': recovery_time,
+        'p99_ms_after_fault': p99 * 1000 if p99 is not None else None,
+    }
+
+
+def print_table(reports):
+    print(f'{"scenario":<16}{"pushes":>8}{"ok":>8}{"lost":>6}{"dup":>6}{"unack":>7}{"resets":>8}{"conns":>7}{"recovery s":>12}{"p99 ms":>10}  failures')
+    for report in reports:
+        recovery = f'{report["recovery_seconds"]:.3f}' if report['recovery_seconds'] is not None else '-'
+        p99 = f'{report["p99_ms_after_fault"]:.1f}' if report['p99_ms_after_fault'] is not None else '-'
+        failures = ', '.join(f'{name}={count}' for name, count in sorted(report['failures'].items()))
+        print(f'{report["scenario"]:<16}{report["pushes"]:>8}{report["succeeded"]:>8}{report["lost"]:>6}{report["duplicated"]:>6}{report["unacknowledged"]:>7}{report["connection_resets"]:>8}{report["server_connections"]:>7}{recovery:>12}{p99:>10}  {failures}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measures how pyapns_client recovers from APNs faults.')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='can be repeated, all by default')
+    parser.add_argument('--rate', type=float, default=100.0, help='pushes per second')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of pushes per scenario, the faults start at 2s')
+    parser.add_argument('--workers', type=int, default=16, help='threads calling try_push')
+    parser.add_argument('--connections', type=int, default=2)
+    parser.add_argument('--connect-timeout', type=float, default=1.0)
+    parser.add_argument('--latency', type=float, default=0.005, help='server latency in seconds')
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    options = parser.parse_args()
+
+    reports = [run_scenario(name, SCENARIOS[name], options) for name in options.scenario or SCENARIOS]
+
+    if options.json:
+        print(json.dumps({'reports': reports}, indent=2))
+    else:
+        print_table(reports)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import resource
+import time
+from collections import Counter
+
+from pyapns_client import APNSClient, AsyncAPNSClient, IOSNotification, IOSPayload, IOSPayloadAlert, ShardedSender
+
+from .mock_server import MockAPNSServer, parse_errors
+
+
+# Usage, from the repository root:
+#
+#   python -m benchmarks.run --pushes 20000 --latency 0.005 --error Unregistered=0.01 --error TooManyRequests=0.005
+#
+# The mock APNs server runs in a separate process, so it doesn't compete with the client for the GIL.
+
+
+def _serve(connection, options):
+    with MockAPNSServer(**options) as server:
+        connection.send((server.url, server.cert_path, server.auth_key_path))
+        connection.recv()
+        connection.send(dict(server.responses))
+
+
+class _ServerProcess:
+
+    def __init__(self, **options):
+        super().__init__()
+
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_serve, args=(child_connection, options), daemon=True)
+
+    def __enter__(self):
+        self._process.start()
+        self.url, self.cert_path, self.auth_key_path = self._connection.recv()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._connection.send(None)
+        self.responses = self._connection.recv()
+        self._process.join()
+
+
+def get_notification(body='Hello from the benchmark!'):
+    alert = IOSPayloadAlert(title='Benchmark', body=body)
+    payload = IOSPayload(alert=alert, badge=1, sound='default', custom={'id': 12345, 'tags': ['a', 'b']})
+    return IOSNotification(payload=payload, topic='com.example.benchmark')
+
+
+def get_device_tokens(count):
+    return [f'{index:064x}' for index in range(count)]
+
+
+def get_percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, round(percentile / 100 * (len(sorted_values) - 1)))]
+
+
+def get_rss():
+    # The current resident set size in MiB (the peak if /proc is not available).
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(name, elapsed, latencies, outcomes=None):
+    latencies = sorted(latencies)
+    p50 = get_percentile(latencies, 50)
+    p99 = get_percentile(latencies, 99)
+    return {
+        'scenario': name,
+        'operations': len(latencies),
+        'seconds': elapsed,
+        'per_second': len(latencies) / elapsed if elapsed else None,
+        'p50_ms': p50 * 1000 if p50 is not None else None,
+        'p99_ms': p99 * 1000 if p99 is not None else None,
+        'rss_mib': get_rss(),
+        'outcomes': dict(outcomes or {}),
+    }
+
+
+def summarize_results(name, elapsed, results):
+    outcomes = Counter(result.reason or result.status for result in results)
+    return summarize(name, elapsed, [result.latency for result in results], outcomes)
+
+
+def bench_serialize(options, server):
+    # _Payload.to_json through the notification, without compiling it.
+    notification = get_notification()
+    latencies = []
+    start_time = time.perf_counter()
+    for _ in range(options.serializations):
+        operation_start_time = time.perf_counter()
+        notification.get_json_data()
+        latencies.append(time.perf_counter() - operation_start_time)
+    return summarize('serialize', time.perf_counter() - start_time, latencies)
+
+
+def bench_serialize_truncated(options, server):
+    # The alert body doesn't fit and has to be truncated.
+    notification = get_notification(body='Lorem ipsum dolor sit amet. ' * 200)
+    latencies = []
+    start_time = time.perf_counter()
+    for _ in range(options.serializations // 10):
+        operation_start_time = time.perf_counter()
+        notification.get_json_data()
+        latencies.append(time.perf_counter() - operation_start_time)
+    return summarize('serialize_truncated', time.perf_counter() - start_time, latencies)
+
+
+def create_client(client_class, options, server):
+    return client_class(mode=client_class.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='BENCHMARK', team_id='BENCHMARK', connections=options.connections, base_url=server.url)
+
+
+def bench_push(options, server):
+    # Sequential pushes, one round trip at a time.
+    client = create_client(APNSClient, options, server)
+    try:
+        client.connect()
+        notification = get_notification()
+        device_tokens = get_device_tokens(options.pushes // 10)
+        start_time = time.perf_counter()
+        results = [client.try_push(notification=notification, device_token=device_token) for device_token in device_tokens]
+        return summarize_results('push', time.perf_counter() - start_time, results)
+    finally:
+        client.close()
+
+
+def bench_push_many(options, server):
+    client = create_client(APNSClient, options, server)
+    try:
+        client.connect()
+        start_time = time.perf_counter()
+        results = client.push_many(notification=get_notification(), device_tokens=get_device_tokens(options.pushes), concurrency=options.sync_concurrency)
+        return summarize_results('push_many', time.perf_counter() - start_time, results)
+    finally:
+        client.close()
+
+
+def bench_stream(options, server):
+    client = create_client(APNSClient, options, server)
+    try:
+        client.connect()
+        notification = get_notification().compile()
+        items = ((device_token, notification) for device_token in get_device_tokens(options.pushes))
+        start_time = time.perf_counter()
+        results = list(client.stream(items, concurrency=options.sync_concurrency))
+        return summarize_results('stream', time.perf_counter() - start_time, results)
+    finally:
+        client.close()
+
+
+def bench_submit(options, server):
+    client = create_client(APNSClient, options, server)
+    try:
+        notification = get_notification().compile()
+        start_time = time.perf_counter()
+        futures = [client.submit(notification=notification, device_token=device_token) for device_token in get_device_tokens(options.pushes)]
+        client.flush()
+        results = [future.result() for future in futures]
+        return summarize_results('submit', time.perf_counter() - start_time, results)
+    finally:
+        client.close()
+
+
+def bench_async_push_many(options, server):
+    async def run():
+        client = create_client(AsyncAPNSClient, options, server)
+        try:
+            await client.connect()
+            start_time = time.perf_counter()
+            results = await client.push_many(notification=get_notification(), device_tokens=get_device_tokens(options.pushes), concurrency=options.concurrency)
+            return summarize_results('async_push_many', time.perf_counter() - start_time, results)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+def bench_sharded_push_many(options, server):
+    # Compare with async_push_many (and different --processes) to see how the sender scales.
+    sender = ShardedSender(processes=options.processes, concurrency=options.concurrency, mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='BENCHMARK', team_id='BENCHMARK', connections=options.connections, base_url=server.url)
+    try:
+        # Starts the worker processes, so that the measurement doesn't include their start-up.
+        list(sender.push_many(notification=get_notification(), device_tokens=get_device_tokens(options.processes)))
+        start_time = time.perf_counter()
+        results = list(sender.push_many(notification=get_notification(), device_tokens=get_device_tokens(options.pushes)))
+        return summarize_results(f'sharded_push_many/{options.processes}', time.perf_counter() - start_time, results)
+    finally:
+        sender.close()
+
+
+SCENARIOS = {
+    'serialize': bench_serialize,
+    'serialize_truncated': bench_serialize_truncated,
+    'push': bench_push,
+    'push_many': bench_push_many,
+    'stream': bench_stream,
+    'submit': bench_submit,
+    'async_push_many': bench_async_push_many,
+    'sharded_push_many': bench_sharded_push_many,
+}
+
+
+def print_table(reports):
+    print(f'{"scenario":<22}{"ops":>9}{"ops/s":>11}{"p50 ms":>10}{"p99 ms":>10}{"RSS MiB":>10}  outcomes')
+    for report in reports:
+        p50 = f'{report["p50_ms"]:.3f}' if report['p50_ms'] is not None else '-'
+        p99 = f'{report["p99_ms"]:.3f}' if report['p99_ms'] is not None else '-'
+        outcomes = ', '.join(f'{name}={count}' for name, count in sorted(report['outcomes'].items()))
+        print(f'{report["scenario"]:<22}{report["operations"]:>9}{report["per_second"]:>11.0f}{p50:>10}{p99:>10}{report["rss_mib"]:>10.1f}  {outcomes}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks pyapns_client against a local mock APNs server.')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='can be repeated, all by default')
+    parser.add_argument('--pushes', type=int, default=10000, help='pushes per bulk scenario (a tenth for sequential pushes)')
+    parser.add_argument('--serializations', type=int, default=100000)
+    parser.add_argument('--connections', type=int, default=1)
+    parser.add_argument('--sync-concurrency', type=int, default=APNSClient.CONCURRENCY, help='concurrency of the sync bulk scenarios')
+    parser.add_argument('--concurrency', type=int, default=AsyncAPNSClient.CONCURRENCY, help='concurrency of the async scenarios')
+    parser.add_argument('--processes', type=int, default=2, help='worker processes of the sharded scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='server latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra server latency in seconds')
+    parser.add_argument('--error', action='append', metavar='REASON=PROBABILITY', help='e.g. Unregistered=0.01, can be repeated')
+    parser.add_argument('--max-concurrent-streams', type=int, default=1000)
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    options = parser.parse_args()
+
+    server_options = {'latency': options.latency, 'jitter': options.jitter, 'errors': parse_errors(options.error), 'max_concurrent_streams': options.max_concurrent_streams, 'seed': 0}
+    reports = []
+    with _ServerProcess(**server_options) as server:
+        for name in options.scenario or SCENARIOS:
+            reports.append(SCENARIOS[name](options, server))
+
+    if options.json:
+        print(json.dumps({'reports': reports, 'server_responses': server.responses}, indent=2))
+    else:
+        print_table(reports)
+
+
+if __name__ == '__main__':
+    main()
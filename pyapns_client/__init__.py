@@ -1,5 +1,20 @@
-from .client import (
-    APNSClient,
+import importlib
+
+from .auth import (
+    ProviderTokenManager,
+)
+
+from .circuit import (
+    CircuitBreaker,
+)
+
+from .concurrency import (
+    ConcurrencyController,
+)
+
+from .device_tokens import (
+    normalize_device_token,
+    normalize_device_tokens,
 )
 
 from .exceptions import (
@@ -8,6 +23,7 @@ from .exceptions import (
     APNSServerException,
     APNSProgrammingException,
     APNSConnectionException,
+    APNSTimeoutException,
     BadCollapseIdException,
     BadDeviceTokenException,
     BadExpirationDateException,
@@ -42,11 +58,69 @@ from .logging import (
     logger,
 )
 
+from .metrics import (
+    MetricsCollector,
+    MetricsHook,
+)
+
+from .profiling import (
+    PhaseStats,
+)
+
+from .ratelimit import (
+    RateLimiter,
+)
+
+from .result import (
+    PushResult,
+)
+
+from .retry import (
+    RetryPolicy,
+    RetryStats,
+)
+
+from .serializers import (
+    JSONSerializer,
+    OrjsonSerializer,
+    get_serializer,
+    set_serializer,
+)
+
 from .notification import (
     IOSNotification,
     SafariNotification,
+    CompiledNotification,
+    PayloadSlot,
+    PayloadTemplate,
+    NotificationTemplate,
     IOSPayload,
     SafariPayload,
     IOSPayloadAlert,
     SafariPayloadAlert,
 )
+
+
+# The clients need httpx (and signing the provider tokens PyJWT and cryptography), which are slow
+# to import. They are only imported on first use, so building payloads doesn't pay for them.
+_LAZY_IMPORTS = {
+    'APNSClient': 'client',
+    'AsyncAPNSClient': 'client',
+    'ShardedSender': 'sharding',
+}
+
+# `from pyapns_client import *` keeps exporting the clients too, that imports them.
+__all__ = [name for name in globals() if not name.startswith('_') and name != 'importlib'] + list(_LAZY_IMPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_IMPORTS))
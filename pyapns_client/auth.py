@@ -0,0 +1,211 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+from .logging import logger
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class ProviderTokenManager:
+
+    ALGORITHM = 'ES256'
+
+    # APNs rejects tokens older than an hour and tokens updated more often than every 20 minutes.
+    LIFETIME = 45 * 60  # seconds
+
+    # Tokens are refreshed in the background this long before they expire, off the request path.
+    REFRESH_MARGIN = 5 * 60  # seconds
+
+    _shared_managers = {}
+    _shared_managers_lock = threading.Lock()
+
+    def __init__(self, auth_key, auth_key_id, team_id, cache_path=None, background_refresh=True):
+        super().__init__()
+
+        self._auth_key = auth_key
+        self._auth_key_id = auth_key_id
+        self._team_id = team_id
+
+        # An optional file used to share a single token between processes on the same host,
+        # e.g. prefork workers. Put it on a tmpfs (such as /dev/shm) to keep it in memory.
+        self._cache_path = cache_path
+
+        self._background_refresh = background_refresh
+
+        # An (auth_token, issued_at) tuple, always replaced as a whole so it can be read without locking.
+        self._storage = None
+        self._lock = threading.Lock()
+
+        # Set by `invalidate`, a token issued before this time is not loaded from the cache again.
+        self._invalidated_before = None
+
+        # Set on every read, the background thread only keeps refreshing tokens which are used.
+        self._used = False
+        self._refresh_thread = None
+        self._refresh_thread_pid = None
+
+        # The number of tokens this manager created (not counting tokens loaded from the cache).
+        self.created_tokens = 0
+
+        # MetricsHook instances of the clients using this manager, notified when the token is replaced.
+        self._metrics_hooks = ()
+
+    @classmethod
+    def get_shared(cls, auth_key, auth_key_id, team_id, cache_path=None):
+        # Returns a manager shared by all the clients using the same key and team in this process.
+        key = (team_id, auth_key_id, auth_key, cache_path)
+        with cls._shared_managers_lock:
+            manager = cls._shared_managers.get(key)
+            if manager is None:
+                manager = cls(auth_key=auth_key, auth_key_id=auth_key_id, team_id=team_id, cache_path=cache_path)
+                cls._shared_managers[key] = manager
+            return manager
+
+    @property
+    def token(self):
+        self._used = True
+        storage = self._storage
+        if storage is None or self._is_expired(storage):
+            storage = self._refresh(only_if_expired=True)
+        elif self._background_refresh and self._refresh_thread_pid != os.getpid():
+            self._start_refresh_thread()
+        return storage[0]
+
+    @property
+    def issued_at(self):
+        storage = self._storage
+        return storage[1] if storage is not None else None
+
+    def invalidate(self, issued_before):
+        # Called when APNs reports an expired token. Concurrent requests can fail with the same
+        # token, so only a token issued before the failed request was sent is replaced.
+        with self._lock:
+            storage = self._storage
+            if storage is not None and storage[1] < issued_before:
+                logger.debug('Invalidating the authentication token.')
+                self._storage = None
+                self._invalidated_before = issued_before
+
+    def reset(self):
+        with self._lock:
+            self._storage = None
+
+    def add_metrics_hook(self, metrics_hook):
+        with self._lock:
+            if metrics_hook not in self._metrics_hooks:
+                self._metrics_hooks += (metrics_hook,)
+
+    def _is_expired(self, storage, margin=0):
+        return time.time() >= storage[1] + self.LIFETIME - margin
+
+    def _refresh(self, only_if_expired):
+        with self._lock:
+            storage = self._storage
+            if only_if_expired and storage is not None and not self._is_expired(storage):
+                return storage
+
+            if self._cache_path is not None:
+                storage = self._refresh_cached(min_issued_at=self._invalidated_before)
+            else:
+                storage = self._create()
+            self._storage = storage
+            self._invalidated_before = None
+
+            for metrics_hook in self._metrics_hooks:
+                metrics_hook.record_token_refresh()
+
+        if self._background_refresh:
+            self._start_refresh_thread()
+        return storage
+
+    def _refresh_cached(self, min_issued_at):
+        # Holds an exclusive lock on the cache file while checking it, so only one process on
+        # the host creates a new token and the others pick it up.
+        with open(f'{self._cache_path}.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                storage = self._read_cache()
+                if storage is not None and not self._is_expired(storage, margin=self.REFRESH_MARGIN) and (min_issued_at is None or storage[1] >= min_issued_at):
+                    logger.debug('Loaded the authentication token from the cache.')
+                    return storage
+
+                storage = self._create()
+                self._write_cache(storage)
+                return storage
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_cache(self):
+        try:
+            with open(self._cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('team_id') != self._team_id or data.get('auth_key_id') != self._auth_key_id:
+            return None
+        return data['auth_token'], data['issued_at']
+
+    def _write_cache(self, storage):
+        data = {'team_id': self._team_id, 'auth_key_id': self._auth_key_id, 'auth_token': storage[0], 'issued_at': storage[1]}
+        directory = os.path.dirname(os.path.abspath(self._cache_path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.pyapns_client')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, self._cache_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def _create(self):
+        logger.debug('Creating a new authentication token.')
+        issued_at = time.time()
+        token_dict = {'iss': self._team_id, 'iat': issued_at}
+        headers = {'alg': self.ALGORITHM, 'kid': self._auth_key_id}
+        # PyJWT (and cryptography with it) is slow to import, so only a process signing tokens imports it.
+        import jwt
+
+        auth_token = jwt.encode(token_dict, self._auth_key, algorithm=self.ALGORITHM, headers=headers)
+        self.created_tokens += 1
+        return auth_token, issued_at
+
+    def _start_refresh_thread(self):
+        # Threads don't survive a fork, so a forked worker starts its own.
+        pid = os.getpid()
+        with self._lock:
+            if self._refresh_thread_pid == pid and self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread_pid = pid
+            self._refresh_thread = threading.Thread(target=self._run_refresh_thread, name='pyapns_client.provider_token', daemon=True)
+            self._refresh_thread.start()
+
+    def _run_refresh_thread(self):
+        while True:
+            storage = self._storage
+            if storage is not None:
+                delay = storage[1] + self.LIFETIME - self.REFRESH_MARGIN - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+                    continue
+
+            # Stop refreshing tokens nobody uses anymore, the next read restarts the thread.
+            if not self._used:
+                with self._lock:
+                    self._refresh_thread_pid = None
+                return
+
+            self._used = False
+            try:
+                self._refresh(only_if_expired=False)
+            except Exception:
+                logger.exception('Failed to refresh the authentication token.')
+                time.sleep(self.REFRESH_MARGIN / 10)
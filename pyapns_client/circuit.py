@@ -0,0 +1,108 @@
+import threading
+import time
+
+from . import exceptions
+from .logging import logger
+
+
+class CircuitBreaker:
+
+    # Pushes are sent normally.
+    STATE_CLOSED = 'closed'
+
+    # Pushes fail fast with APNSConnectionException without touching the network.
+    STATE_OPEN = 'open'
+
+    # A single probe push is let through, its outcome closes or reopens the circuit.
+    STATE_HALF_OPEN = 'half_open'
+
+    # Outcomes showing that APNs (or the way to it) is degraded. Any other response, even an error
+    # about the notification or the device, shows that the server is reachable.
+    FAILURE_EXCEPTION_CLASSES = (
+        exceptions.APNSConnectionException,
+        exceptions.InternalServerErrorException,
+        exceptions.ServiceUnavailableException,
+    )
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        super().__init__()
+
+        # The circuit opens after `failure_threshold` consecutive failed attempts and stays
+        # open for `recovery_timeout` seconds before a probe is sent.
+        self._failure_threshold = failure_threshold
+        self._recovery_timeout = recovery_timeout
+
+        self._state = self.STATE_CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+        self.trips = 0
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def failures(self):
+        return self._failures
+
+    def allow(self):
+        # True if an attempt may be sent now. In the half-open state only one caller gets True.
+        if self._state == self.STATE_CLOSED:
+            return True
+        with self._lock:
+            if self._state == self.STATE_CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.STATE_OPEN and now - self._opened_at >= self._recovery_timeout:
+                logger.debug('Circuit half-open: sending a probe.')
+                self._state = self.STATE_HALF_OPEN
+                self._probe_started_at = now
+                return True
+            if self._state == self.STATE_HALF_OPEN and now - self._probe_started_at >= self._recovery_timeout:
+                # The probe never reported back, another one is sent instead.
+                logger.debug('Circuit half-open: the probe expired, sending another one.')
+                self._probe_started_at = now
+                return True
+            return False
+
+    def release(self):
+        # Called instead of `record` when an allowed attempt wasn't sent after all. A pending probe
+        # is given up, so the next caller sends one.
+        if self._state != self.STATE_HALF_OPEN:
+            return
+        with self._lock:
+            if self._state == self.STATE_HALF_OPEN:
+                self._state = self.STATE_OPEN
+                self._probe_started_at = None
+
+    def record(self, exception_class=None):
+        # Called with the outcome of every allowed attempt that was sent, None on success.
+        failed = exception_class is not None and issubclass(exception_class, self.FAILURE_EXCEPTION_CLASSES)
+        if not failed and self._state == self.STATE_CLOSED and not self._failures:
+            return
+
+        with self._lock:
+            if not failed:
+                if self._state != self.STATE_CLOSED:
+                    logger.debug('Circuit closed.')
+                self._state = self.STATE_CLOSED
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self._state == self.STATE_HALF_OPEN or (self._state == self.STATE_CLOSED and self._failures >= self._failure_threshold):
+                logger.debug(f'Circuit open after {self._failures} failures.')
+                self._state = self.STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+                self.trips += 1
+
+    def reset(self):
+        with self._lock:
+            self._state = self.STATE_CLOSED
+            self._failures = 0
+            self._opened_at = None
+            self._probe_started_at = None
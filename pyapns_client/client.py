@@ -1,13 +1,26 @@
+import asyncio
 import httpx
-import jwt
-import json
+import logging
+import os
+import queue
+import threading
 import time
+import weakref
+from concurrent.futures import Future, wait
+from operator import itemgetter
 
 from . import exceptions
+from .auth import ProviderTokenManager
+from .device_tokens import normalize_device_token, normalize_device_tokens
 from .logging import logger
+from .pool import AsyncConnectionPool
+from .profiling import PhaseStats, add_phase_time, current_phases
+from .result import PushResult
+from .retry import RetryPolicy, RetryStats
+from .serializers import get_serializer
 
 
-class APNSClient:
+class _BaseAPNSClient:
 
     MODE_PROD = 'prod'
     MODE_DEV = 'dev'
@@ -17,136 +30,900 @@ class APNSClient:
         MODE_DEV: 'https://api.development.push.apple.com:443',
     }
 
-    AUTH_TOKEN_LIFETIME = 45 * 60  # seconds
-    AUTH_TOKEN_ENCRYPTION = 'ES256'
+    CONNECTION_POOL_CLASS = None
 
-    def __init__(self, mode, root_cert_path, auth_key_path, auth_key_id, team_id):
+    # Number of concurrent requests `push_many` and `stream` keep in flight.
+    CONCURRENCY = 100
+
+    def __init__(self, mode, root_cert_path, auth_key_path, auth_key_id, team_id, connections=1, retry_policy=None, token_manager=None, token_cache_path=None, rate_limiter=None, concurrency_controller=None, circuit_breaker=None, timeout=10.0, connect_timeout=None, read_timeout=None, write_timeout=None, pool_timeout=None, keepalive_interval=60.0, metrics=None, profile_phases=False, base_url=None, validate_device_tokens=True):
         super().__init__()
 
+        # Used to create a client of the other kind with the same configuration.
+        self._init_kwargs = {
+            'mode': mode,
+            'root_cert_path': root_cert_path,
+            'auth_key_path': auth_key_path,
+            'auth_key_id': auth_key_id,
+            'team_id': team_id,
+            'connections': connections,
+            'retry_policy': retry_policy,
+            'token_manager': token_manager,
+            'token_cache_path': token_cache_path,
+            'rate_limiter': rate_limiter,
+            'concurrency_controller': concurrency_controller,
+            'circuit_breaker': circuit_breaker,
+            'timeout': timeout,
+            'connect_timeout': connect_timeout,
+            'read_timeout': read_timeout,
+            'write_timeout': write_timeout,
+            'pool_timeout': pool_timeout,
+            'keepalive_interval': keepalive_interval,
+            'metrics': metrics,
+            'profile_phases': profile_phases,
+            'base_url': base_url,
+            'validate_device_tokens': validate_device_tokens,
+        }
+
         if root_cert_path is None:
             root_cert_path = True
 
-        self._base_url = self.BASE_URLS[mode]
+        # `base_url` overrides the APNs endpoint of the mode, e.g. to send to a proxy or a mock server.
+        self._base_url = base_url or self.BASE_URLS[mode]
         self._root_cert_path = root_cert_path
-        self._auth_key = self._get_auth_key(auth_key_path)
-        self._auth_key_id = auth_key_id
-        self._team_id = team_id
 
-        self._auth_token_time = None
-        self._auth_token_storage = None
-        self._client_storage = None
+        # Request timeouts in seconds, `timeout` applies to the phases without a specific timeout.
+        phase_timeouts = {'connect': connect_timeout, 'read': read_timeout, 'write': write_timeout, 'pool': pool_timeout}
+        self._timeout = httpx.Timeout(timeout, **{phase: value for phase, value in phase_timeouts.items() if value is not None})
+
+        # Provider tokens are shared by all the clients using the same key and team (and by all the
+        # processes using the same `token_cache_path`), and refreshed in the background before they expire.
+        if token_manager is None:
+            auth_key = self._get_auth_key(auth_key_path)
+            token_manager = ProviderTokenManager.get_shared(auth_key=auth_key, auth_key_id=auth_key_id, team_id=team_id, cache_path=token_cache_path)
+        self._token_manager = token_manager
+
+        # A pool of persistent HTTP/2 connections, requests are balanced by the number of open streams.
+        # APNSClient has none of its own, it sends through the pool of its background AsyncAPNSClient.
+        self._pool = self.CONNECTION_POOL_CLASS(size=connections, client_factory=self._create_client) if self.CONNECTION_POOL_CLASS is not None else None
+
+        self._retry_policy = retry_policy or RetryPolicy()
+        self.retry_stats = RetryStats()
+
+        # An optional RateLimiter, pushes over its budget are delayed (or coalesced) before they are sent.
+        self._rate_limiter = rate_limiter
+
+        # An optional ConcurrencyController, which adapts the number of requests in flight to the
+        # latency and the pushback from APNs (instead of the fixed `concurrency` of the bulk APIs).
+        self._concurrency_controller = concurrency_controller
+
+        # An optional CircuitBreaker, while it is open pushes fail fast instead of waiting for timeouts.
+        self._circuit_breaker = circuit_breaker
+
+        # After `connect`, connections idle for `keepalive_interval` seconds are health checked in the
+        # background and replaced if they are dead. None disables the health checks.
+        self._keepalive_interval = keepalive_interval
+
+        # An optional MetricsHook (e.g. a MetricsCollector) receiving latencies, outcomes and connection events.
+        self._metrics = metrics
+        if metrics is not None:
+            self._token_manager.add_metrics_hook(metrics)
+
+        # When enabled, the time spent in every phase of a push is recorded on its PushResult and
+        # summed up in `phase_stats`. When disabled, no clock is read for it.
+        self._profile_phases = profile_phases
+        self.phase_stats = PhaseStats()
+
+        # When enabled, device tokens are normalized (see normalize_device_token) and invalid ones fail
+        # with BadDeviceTokenException before anything is sent, instead of after a round trip to APNs.
+        self._validate_device_tokens = validate_device_tokens
+
+    def _get_retry(self, exception_class, retry, start_time, deadline=None, attempt_duration=0.0):
+        elapsed_time = time.perf_counter() - start_time
+        next_retry = self._retry_policy.get_retry(exception_class, retry=retry, elapsed_time=elapsed_time)
+
+        # Another attempt is only made if it can complete (taking as long as the last one) before the deadline.
+        if next_retry is not None and deadline is not None and time.perf_counter() + next_retry[1] + attempt_duration > deadline:
+            logger.debug(f'Not retrying after {exception_class.__name__}: the deadline leaves no time for another attempt.')
+            next_retry = None
+
+        if next_retry is None:
+            if retry > 0 or self._retry_policy.get_action(exception_class) is not None:
+                self.retry_stats.record_exhausted()
+            return None
+
+        action, delay = next_retry
+        logger.debug(f'Retrying after {exception_class.__name__}: {action} in {round(delay * 1000)}ms.')
+        self.retry_stats.record_retry(action, delay)
+        if self._metrics is not None:
+            self._metrics.record_retry(action, exception_class)
+        return next_retry
+
+    def _reserve_rate_limit(self, device_token):
+        delay, ticket = self._rate_limiter.reserve(device_token)
+        if delay > 0:
+            logger.debug(f'Rate limited: waiting {round(delay * 1000)}ms.')
+        return delay, ticket
+
+    def _get_coalesced_result(self, device_token, ticket):
+        if not self._rate_limiter.is_superseded(device_token, ticket):
+            return None
+        logger.debug('Coalesced with a newer notification.')
+        return PushResult(device_token=device_token, status=PushResult.STATUS_COALESCED)
+
+    @staticmethod
+    def _get_deadline(deadline):
+        # Turns a `deadline` in seconds from now into a time.perf_counter() value.
+        return time.perf_counter() + deadline if deadline is not None else None
+
+    @staticmethod
+    def _is_past(deadline, delay=0.0):
+        return deadline is not None and time.perf_counter() + delay >= deadline
+
+    @staticmethod
+    def _get_remaining(deadline):
+        # The seconds left until the deadline, to bound a wait with.
+        return max(deadline - time.perf_counter(), 0.0)
+
+    def _get_deadline_result(self, device_token):
+        logger.debug('Deadline exceeded before the notification could be sent.')
+        return PushResult(device_token=device_token, status=PushResult.STATUS_FAILURE, exception_class=exceptions.APNSTimeoutException)
+
+    def _get_request_timeout(self, deadline):
+        # Every phase of a request is bounded by the time left until the deadline.
+        if deadline is None:
+            return httpx.USE_CLIENT_DEFAULT
+        remaining = deadline - time.perf_counter()
+        return httpx.Timeout(**{phase: remaining if value is None else min(value, remaining) for phase, value in self._timeout.as_dict().items()})
+
+    def _get_circuit_open_result(self, device_token):
+        if self._circuit_breaker is None or self._circuit_breaker.allow():
+            return None
+        logger.debug('Circuit open: failing fast.')
+        return PushResult(device_token=device_token, status=PushResult.STATUS_FAILURE, exception_class=exceptions.APNSConnectionException)
+
+    def _record_circuit(self, result):
+        # An attempt that didn't complete (e.g. it was cancelled) counts as a connection failure.
+        exception_class = result.exception_class if result is not None else exceptions.APNSConnectionException
+        self._circuit_breaker.record(exception_class)
+
+    def _release_unsent(self, acquired_at):
+        # An attempt stopped before it was sent (the deadline passed, or waiting for a slot failed
+        # or was cancelled) says nothing about APNs: its slot and its circuit permission are released.
+        if acquired_at is not None:
+            self._concurrency_controller.release()
+        if self._circuit_breaker is not None:
+            self._circuit_breaker.release()
+
+    def _release_concurrency(self, acquired_at, result):
+        # The server may raise its stream limit after the first requests, so it is read after every response.
+        if result is not None and result.status_code is not None:
+            self._concurrency_controller.set_stream_limit(self._pool.max_streams)
+        exception_class = result.exception_class if result is not None else None
+        self._concurrency_controller.release(acquired_at=acquired_at if result is not None else None, exception_class=exception_class)
+
+    def _get_concurrency(self, concurrency):
+        if concurrency:
+            return concurrency
+        if self._concurrency_controller is not None:
+            return self._concurrency_controller.maximum
+        return self.CONCURRENCY
+
+    def _normalize_device_token(self, device_token):
+        if not self._validate_device_tokens:
+            return device_token
+        return normalize_device_token(device_token)
+
+    def _normalize_device_tokens(self, device_tokens):
+        if not self._validate_device_tokens:
+            return list(device_tokens)
+        return normalize_device_tokens(device_tokens)
+
+    def _get_bad_device_token_result(self, device_token):
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Invalid device token: "{device_token}".')
+        result = PushResult(device_token=device_token, status=PushResult.STATUS_FAILURE, reason='BadDeviceToken', exception_class=exceptions.BadDeviceTokenException)
+        self._finish_result(result, start_time=time.perf_counter())
+        return result
+
+    def _serialize(self, notification):
+        # Returns a (headers, json_data, phases) tuple, phases is None unless profiling.
+        if not self._profile_phases:
+            return notification.get_headers(), notification.get_json_data(), None
 
-    def push(self, notification, device_token):
+        start_time = time.perf_counter()
         headers = notification.get_headers()
         json_data = notification.get_json_data()
+        return headers, json_data, {PhaseStats.PHASE_SERIALIZE: time.perf_counter() - start_time}
 
-        logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to: "{device_token}".')
+    def _get_result(self, response, device_token):
+        if logger.isEnabledFor(logging.DEBUG):
+            status = 'success' if response.status_code == 200 else 'failure'
+            logger.debug(f'Response received: {response.status_code} ({status}).')
 
-        exc = None
-        start_time = time.perf_counter()
-        for _ in range(3):
-            try:
-                self._push(headers=headers, json_data=json_data, device_token=device_token)
-                exc = None
-                break
-            except exceptions.APNSServerException as e:
-                exc = e
-                self._reset_client()
-            except exceptions.APNSException as e:
-                exc = e
-                break
-        duration = round((time.perf_counter() - start_time) * 1000)
+        apns_id = response.headers.get('apns-id')
+        if response.status_code == 200:
+            return PushResult(device_token=device_token, status=PushResult.STATUS_SUCCESS, status_code=response.status_code, apns_id=apns_id)
+
+        try:
+            apns_data = get_serializer().loads(response.content)
+        except ValueError:
+            apns_data = None
+        if not isinstance(apns_data, dict):
+            # Not an APNs error body, e.g. an empty body or the HTML error page of a proxy.
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'Invalid response body ({len(response.content)} bytes).')
+            return PushResult(device_token=device_token, status=PushResult.STATUS_UNKNOWN, status_code=response.status_code, apns_id=apns_id)
+
+        reason = apns_data.get('reason')
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Response reason: {reason}.')
+
+        exception_class = exceptions.REASON_EXCEPTION_CLASSES.get(reason)
+        status = PushResult.STATUS_FAILURE if exception_class is not None else PushResult.STATUS_UNKNOWN
+        return PushResult(device_token=device_token, status=status, status_code=response.status_code, reason=reason, apns_id=apns_id, timestamp=apns_data.get('timestamp'), exception_class=exception_class)
+
+    def _get_connection_failure_result(self, device_token, exc):
+        logger.debug(f'Failed to receive a response: {type(exc).__name__}.')
+        exception_class = exceptions.APNSTimeoutException if isinstance(exc, httpx.TimeoutException) else exceptions.APNSConnectionException
+        return PushResult(device_token=device_token, status=PushResult.STATUS_FAILURE, exception_class=exception_class)
+
+    def _finish_result(self, result, start_time, phases=None):
+        result.latency = time.perf_counter() - start_time
+        if phases is not None:
+            result.phases = phases
+            self.phase_stats.record(phases)
+        if self._metrics is not None:
+            self._metrics.record_push(result)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            duration = round(result.latency * 1000)
+            if not result.is_success:
+                name = result.exception_class.__name__ if result.exception_class is not None else result.reason or result.status
+                logger.debug(f'Failed to send the notification: {name} {duration}ms.')
+            else:
+                logger.debug(f'Sent: {duration}ms.')
+
+        return result
 
+    @staticmethod
+    def _raise_for_result(result):
+        exc = result.to_exception()
         if exc is not None:
-            logger.debug(f'Failed to send the notification: {type(exc).__name__} {duration}ms.')
             raise exc
 
-        logger.debug(f'Sent: {duration}ms.')
+    def _get_client_kwargs(self):
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        return {'auth': self._authenticate_request, 'verify': self._root_cert_path, 'http2': True, 'timeout': self._timeout, 'limits': limits, 'base_url': self._base_url}
+
+    def _authenticate_request(self, request):
+        phases = current_phases.get() if self._profile_phases else None
+        if phases is None:
+            request.headers['authorization'] = f'bearer {self._auth_token}'
+            return request
+
+        # Runs within the network phase, so its time is moved from there to the auth phase.
+        start_time = time.perf_counter()
+        auth_token = self._auth_token
+        duration = time.perf_counter() - start_time
+        add_phase_time(phases, PhaseStats.PHASE_AUTH, duration)
+        add_phase_time(phases, PhaseStats.PHASE_NETWORK, -duration)
+
+        request.headers['authorization'] = f'bearer {auth_token}'
+        return request
+
+    @property
+    def _auth_token(self):
+        return self._token_manager.token
+
+    def _refresh_auth_token(self, issued_before):
+        self._token_manager.invalidate(issued_before=issued_before)
+
+    @staticmethod
+    def _get_url(device_token):
+        return f'/3/device/{device_token}'
+
+    @staticmethod
+    def _get_auth_key(auth_key_path):
+        with open(auth_key_path) as f:
+            return f.read()
+
+
+class APNSClient(_BaseAPNSClient):
+
+    # Number of requests `submit` keeps in flight on the background event loop.
+    SUBMIT_CONCURRENCY = 100
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Started by the first push, and again in a forked process (threads don't survive a fork).
+        # Stopped by `close`, or when the client is garbage collected.
+        self._background_sender = None
+        self._background_sender_finalizer = None
+        self._background_sender_lock = threading.Lock()
+        self._submitted_futures = set()
+
+    def connect(self):
+        # Opens all the connections of the pool ahead of the first push and starts the background
+        # health checks. Raises APNSConnectionException if a connection couldn't be established.
+        # All the pushes are sent by the background sender, so its connections are the ones opened.
+        self._get_background_sender().connect()
+
+    def push(self, notification, device_token, deadline=None):
+        # `deadline` bounds the time (in seconds) spent on the push, including retries.
+        result = self._try_push(notification=notification, device_token=device_token, deadline=self._get_deadline(deadline))
+        self._raise_for_result(result)
+
+    def try_push(self, notification, device_token, deadline=None):
+        # Like `push`, but returns a PushResult instead of raising on failure.
+        return self._try_push(notification=notification, device_token=device_token, deadline=self._get_deadline(deadline))
+
+    def push_many(self, notification, device_tokens, concurrency=None, deadline=None):
+        # Returns a list of PushResult objects in the order of `device_tokens`. Pushes not sent
+        # before the `deadline` (in seconds, for the whole call) fail with APNSTimeoutException.
+        headers, json_data, phases = self._serialize(notification)
+        deadline = self._get_deadline(deadline)
+
+        # Encoded once for all the pushes, so not counted per push.
+        if phases is not None:
+            self.phase_stats.record(phases, push=False)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to many devices.')
+
+        items = self._get_push_many_items(headers=headers, json_data=json_data, device_tokens=device_tokens, deadline=deadline)
+        results = list(self._map_concurrently(items=items, concurrency=concurrency))
+
+        results.sort(key=itemgetter(0))
+        return [result for _, result in results]
+
+    def stream(self, items, concurrency=None, deadline=None):
+        # Pulls (device_token, notification) tuples lazily from `items` and yields
+        # PushResult objects as the pushes complete, in completion order.
+        # At most `concurrency` pushes are in flight, so memory use stays constant.
+        items = self._get_stream_items(items, deadline=self._get_deadline(deadline))
+        for _, result in self._map_concurrently(items=items, concurrency=concurrency):
+            yield result
+
+    def submit(self, notification, device_token, deadline=None):
+        # Returns a concurrent.futures.Future resolving to a PushResult right away. The push runs
+        # on a background event loop thread, which multiplexes all the submitted pushes over HTTP/2.
+        normalized_device_token = self._normalize_device_token(device_token)
+        if normalized_device_token is None:
+            future = Future()
+            future.set_result(self._get_bad_device_token_result(device_token))
+            return future
+        device_token = normalized_device_token
+
+        headers, json_data, phases = self._serialize(notification)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Submitting notification: {len(json_data)} bytes {json_data} to: "{device_token}".')
+
+        background_sender = self._get_background_sender()
+        future = background_sender.submit(headers=headers, json_data=json_data, device_token=device_token, deadline=self._get_deadline(deadline), phases=phases)
+        # Adding to and removing from a set are atomic, so no lock is taken per push.
+        self._submitted_futures.add(future)
+        future.add_done_callback(self._discard_submitted_future)
+        return future
+
+    def flush(self, timeout=None):
+        # Waits until all the pushes submitted so far have completed. Returns True if they have.
+        self._reset_if_forked()
+        futures = self._submitted_futures.copy()
+        if not futures:
+            return True
+        return not wait(futures, timeout=timeout).not_done
 
     def close(self):
-        self._reset_client()
-        self._reset_auth_token()
+        # The provider token is kept, it may be shared with other clients.
+        self._close_background_sender()
         logger.debug('Closed.')
 
-    def _push(self, headers, json_data, device_token):
-        try:
-            response = self._send_request(headers=headers, json_data=json_data, device_token=device_token)
-        except httpx.RequestError as e:
-            logger.debug(f'Failed to receive a response: {type(e).__name__}.')
-            raise exceptions.APNSConnectionException()
+    def _get_background_sender(self):
+        # Read without locking on the hot path, the lock is only taken to start the sender.
+        background_sender = self._background_sender
+        if background_sender is not None and background_sender.pid == os.getpid():
+            return background_sender
+
+        self._reset_if_forked()
+        with self._background_sender_lock:
+            if self._background_sender is None:
+                logger.debug('Starting the background sender.')
+                async_client = AsyncAPNSClient(**self._init_kwargs)
+                async_client.retry_stats = self.retry_stats
+                async_client.phase_stats = self.phase_stats
+                concurrency = self._concurrency_controller.maximum if self._concurrency_controller is not None else self.SUBMIT_CONCURRENCY
+                background_sender = _BackgroundSender(async_client=async_client, concurrency=concurrency)
+                # The finalizer must not reference the client, or the client would never be collected.
+                self._background_sender_finalizer = weakref.finalize(self, background_sender.stop)
+                self._background_sender_finalizer.atexit = False
+                self._background_sender = background_sender
+            return self._background_sender
+
+    def _reset_if_forked(self):
+        background_sender = self._background_sender
+        if background_sender is not None and background_sender.pid != os.getpid():
+            self._reset_after_fork()
+
+    def _reset_after_fork(self):
+        # The sender inherited from the parent process has no thread running its event loop here,
+        # and its connections belong to the parent, so it is dropped without closing them. Its
+        # lock and submitted pushes are dropped too, another thread of the parent may have held them.
+        logger.debug('Forked: dropping the background sender of the parent process.')
+        if self._background_sender_finalizer is not None:
+            self._background_sender_finalizer.detach()
+        self._background_sender_finalizer = None
+        self._background_sender_lock = threading.Lock()
+        self._submitted_futures = set()
+        self._background_sender = None
+
+    def _close_background_sender(self):
+        # Drains the in-flight submitted pushes before stopping the background thread.
+        self.flush()
+        with self._background_sender_lock:
+            background_sender = self._background_sender
+            self._background_sender = None
+            if self._background_sender_finalizer is not None:
+                self._background_sender_finalizer.detach()
+                self._background_sender_finalizer = None
+        if background_sender is not None:
+            background_sender.close()
+            logger.debug('Stopped the background sender.')
+
+    def _discard_submitted_future(self, future):
+        self._submitted_futures.discard(future)
+
+    def _map_concurrently(self, items, concurrency=None):
+        # Sends (key, headers, json_data, device_token, deadline, phases) items on the background event
+        # loop, where the pushes share the HTTP/2 connections as parallel streams, and yields
+        # (key, PushResult) tuples in completion order. At most `concurrency` pushes are in flight.
+        # Items without headers have an invalid device token, they fail without being sent.
+        concurrency = self._get_concurrency(concurrency)
+        background_sender = self._get_background_sender()
+        completed = queue.SimpleQueue()
+        in_flight = 0
+
+        for key, headers, json_data, device_token, deadline, phases in items:
+            if in_flight >= concurrency:
+                yield self._get_completed(completed)
+                in_flight -= 1
+            while not completed.empty():
+                yield self._get_completed(completed)
+                in_flight -= 1
+
+            if headers is None:
+                future = Future()
+                future.set_result(self._get_bad_device_token_result(device_token))
+            else:
+                future = background_sender.submit(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases, bounded=False)
+            future.key = key
+            future.add_done_callback(completed.put)
+            in_flight += 1
+
+        while in_flight:
+            yield self._get_completed(completed)
+            in_flight -= 1
 
-        status = 'success' if response.status_code == 200 else 'failure'
-        logger.debug(f'Response received: {response.status_code} ({status}).')
+    @staticmethod
+    def _get_completed(completed):
+        future = completed.get()
+        return future.key, future.result()
 
-        if response.status_code != 200:
-            apns_id = response.headers.get('apns-id')
-            apns_data = json.loads(response.text)
-            reason = apns_data['reason']
+    def _get_push_many_items(self, headers, json_data, device_tokens, deadline):
+        device_tokens = list(device_tokens)
+        for index, (device_token, normalized_device_token) in enumerate(zip(device_tokens, self._normalize_device_tokens(device_tokens))):
+            if normalized_device_token is None:
+                yield index, None, None, device_token, deadline, None
+            else:
+                yield index, headers, json_data, normalized_device_token, deadline, None
 
-            logger.debug(f'Response reason: {reason}.')
+    def _get_stream_items(self, items, deadline):
+        for device_token, notification in items:
+            normalized_device_token = self._normalize_device_token(device_token)
+            if normalized_device_token is None:
+                yield None, None, None, device_token, deadline, None
+                continue
+            device_token = normalized_device_token
 
-            exception_class = self._get_exception_class(reason)
-            exception_kwargs = {'status_code': response.status_code, 'apns_id': apns_id}
-            if issubclass(exception_class, exceptions.UnregisteredException):
-                exception_kwargs['timestamp'] = apns_data['timestamp']
+            headers, json_data, phases = self._serialize(notification)
 
-            raise exception_class(**exception_kwargs)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to: "{device_token}".')
 
-    def _send_request(self, headers, json_data, device_token):
-        url = f'/3/device/{device_token}'
-        return self._client.post(url, data=json_data, headers=headers)
+            yield None, headers, json_data, device_token, deadline, phases
 
-    def _authenticate_request(self, request):
-        request.headers['authorization'] = f'bearer {self._auth_token}'
-        return request
+    def _try_push(self, notification, device_token, deadline):
+        normalized_device_token = self._normalize_device_token(device_token)
+        if normalized_device_token is None:
+            return self._get_bad_device_token_result(device_token)
+        device_token = normalized_device_token
 
-    @property
-    def _auth_token(self):
-        if self._auth_token_storage is None or self._is_auth_token_expired:
-            logger.debug('Creating a new authentication token.')
-            self._auth_token_time = time.time()
-            token_dict = {'iss': self._team_id, 'iat': self._auth_token_time}
-            headers = {'alg': self.AUTH_TOKEN_ENCRYPTION, 'kid': self._auth_key_id}
-            auth_token = jwt.encode(token_dict, self._auth_key, algorithm=self.AUTH_TOKEN_ENCRYPTION, headers=headers)
-            self._auth_token_storage = auth_token
+        headers, json_data, phases = self._serialize(notification)
 
-        return self._auth_token_storage
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to: "{device_token}".')
 
-    @property
-    def _client(self):
-        if self._client_storage is None:
-            logger.debug('Creating a new client instance.')
-            limits = httpx.Limits(max_connections=1, max_keepalive_connections=0)
-            self._client_storage = httpx.Client(auth=self._authenticate_request, verify=self._root_cert_path, http2=True, timeout=10.0, limits=limits, base_url=self._base_url)
+        # Sent as a stream on the background event loop, like the bulk APIs, so threads pushing at
+        # the same time share the connections. Each calling thread has one push in flight at a time.
+        background_sender = self._get_background_sender()
+        return background_sender.submit(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases, bounded=False).result()
 
-        return self._client_storage
 
-    @property
-    def _is_auth_token_expired(self):
-        if self._auth_token_time is None:
-            return True
-        return time.time() >= self._auth_token_time + self.AUTH_TOKEN_LIFETIME
+class AsyncAPNSClient(_BaseAPNSClient):
+
+    CONNECTION_POOL_CLASS = AsyncConnectionPool
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self._keepalive_task = None
+        self._keepalive_wakeup = None
+
+    async def connect(self):
+        # Opens all the connections of the pool ahead of the first push and starts the background
+        # health checks. Raises APNSConnectionException if a connection couldn't be established.
+        self._start_keepalive()
+        if await self._check_connections():
+            raise exceptions.APNSConnectionException()
+
+    async def push(self, notification, device_token, deadline=None):
+        # `deadline` bounds the time (in seconds) spent on the push, including retries.
+        result = await self._try_push(notification=notification, device_token=device_token, deadline=self._get_deadline(deadline))
+        self._raise_for_result(result)
+
+    async def try_push(self, notification, device_token, deadline=None):
+        # Like `push`, but returns a PushResult instead of raising on failure.
+        return await self._try_push(notification=notification, device_token=device_token, deadline=self._get_deadline(deadline))
+
+    async def push_many(self, notification, device_tokens, concurrency=None, deadline=None):
+        # Returns a list of PushResult objects in the order of `device_tokens`. Pushes not sent
+        # before the `deadline` (in seconds, for the whole call) fail with APNSTimeoutException.
+        headers, json_data, phases = self._serialize(notification)
+        concurrency = self._get_concurrency(concurrency)
+        deadline = self._get_deadline(deadline)
+
+        # Encoded once for all the pushes, so not counted per push.
+        if phases is not None:
+            self.phase_stats.record(phases, push=False)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to many devices.')
+
+        device_tokens = list(device_tokens)
+        results = []
+        items = enumerate(zip(device_tokens, self._normalize_device_tokens(device_tokens)))
+
+        async def worker():
+            for index, (device_token, normalized_device_token) in items:
+                if normalized_device_token is None:
+                    results.append((index, self._get_bad_device_token_result(device_token)))
+                else:
+                    results.append((index, await self._push_with_retries(headers=headers, json_data=json_data, device_token=normalized_device_token, deadline=deadline)))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+        results.sort(key=itemgetter(0))
+        return [result for _, result in results]
+
+    async def stream(self, items, concurrency=None, deadline=None):
+        # Pulls (device_token, notification) tuples lazily from `items` (an iterable or an async
+        # iterable) and yields PushResult objects as the pushes complete, in
+        # completion order. At most `concurrency` pushes are in flight, so memory use stays constant.
+        concurrency = self._get_concurrency(concurrency)
+        deadline = self._get_deadline(deadline)
+        completed = asyncio.Queue()
+        pending = set()
+
+        try:
+            async for device_token, notification in self._iterate(items):
+                if len(pending) >= concurrency:
+                    yield await self._get_completed(completed, pending)
+                while not completed.empty():
+                    yield await self._get_completed(completed, pending)
+
+                task = asyncio.ensure_future(self._stream_item(device_token=device_token, notification=notification, deadline=deadline))
+                task.add_done_callback(completed.put_nowait)
+                pending.add(task)
+
+            while pending:
+                yield await self._get_completed(completed, pending)
+        finally:
+            # Pushes already in flight are finished even if the consumer stops early.
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def close(self):
+        # The provider token is kept, it may be shared with other clients.
+        await self._stop_keepalive()
+        await self._pool.close()
+        logger.debug('Closed.')
 
-    def _reset_auth_token(self):
-        logger.debug('Resetting the existing authentication token.')
-        self._auth_token_time = None
-        self._auth_token_storage = None
+    def _start_keepalive(self):
+        if self._keepalive_interval is None or self._keepalive_task is not None:
+            return
+        logger.debug('Starting the keepalive task.')
+        self._keepalive_wakeup = asyncio.Event()
+        self._keepalive_task = asyncio.ensure_future(self._run_keepalive())
+
+    async def _stop_keepalive(self):
+        keepalive_task = self._keepalive_task
+        self._keepalive_task = None
+        if keepalive_task is not None:
+            keepalive_task.cancel()
+            await asyncio.gather(keepalive_task, return_exceptions=True)
+            logger.debug('Stopped the keepalive task.')
+
+    async def _run_keepalive(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._keepalive_wakeup.wait(), timeout=self._keepalive_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._keepalive_wakeup.clear()
+            # Dead connections are replaced right away, not after another interval.
+            if await self._check_connections(idle_time=self._keepalive_interval):
+                await self._check_connections(idle_time=self._keepalive_interval)
+
+    async def _check_connections(self, idle_time=0.0):
+        # Health checks the connections idle for `idle_time` seconds and opens the missing ones.
+        # Returns the number of dead connections, which are removed from the pool.
+        results = await asyncio.gather(*(self._check_connection(connection) for connection in self._pool.acquire_idle(idle_time)))
+        return results.count(False)
+
+    async def _check_connection(self, connection):
+        try:
+            await self._send_health_check(client=connection.client)
+        except httpx.RequestError as e:
+            logger.debug(f'Health check failed: {type(e).__name__}.')
+            healthy = False
+        else:
+            healthy = True
+        finally:
+            self._pool.release(connection)
+
+        if not healthy and await self._pool.reset(connection) and self._metrics is not None:
+            self._metrics.record_connection_reset()
+        return healthy
+
+    async def _try_push(self, notification, device_token, deadline):
+        normalized_device_token = self._normalize_device_token(device_token)
+        if normalized_device_token is None:
+            return self._get_bad_device_token_result(device_token)
+        device_token = normalized_device_token
+
+        headers, json_data, phases = self._serialize(notification)
 
-    def _reset_client(self):
-        logger.debug('Resetting the existing client instance.')
-        if self._client_storage is not None:
-            self._client_storage.close()
-        self._client_storage = None
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f'Sending notification: {len(json_data)} bytes {json_data} to: "{device_token}".')
+
+        return await self._push_with_retries(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases)
+
+    async def _stream_item(self, device_token, notification, deadline):
+        return await self._try_push(notification=notification, device_token=device_token, deadline=deadline)
 
     @staticmethod
-    def _get_auth_key(auth_key_path):
-        with open(auth_key_path) as f:
-            return f.read()
+    async def _get_completed(completed, pending):
+        task = await completed.get()
+        pending.discard(task)
+        return task.result()
 
     @staticmethod
-    def _get_exception_class(reason):
-        exception_class_name = f'{reason}Exception'
+    async def _iterate(items):
+        if hasattr(items, '__aiter__'):
+            async for item in items:
+                yield item
+        else:
+            for item in items:
+                yield item
+
+    async def _push_with_retries(self, headers, json_data, device_token, deadline=None, phases=None):
+        start_time = time.perf_counter()
+        retry = 0
+        if phases is None and self._profile_phases:
+            phases = {}
+        while True:
+            # Retries are paced by the retry policy, only the first attempt goes through the rate limiter.
+            if self._rate_limiter is not None and retry == 0:
+                delay, ticket = self._reserve_rate_limit(device_token)
+                if delay > 0:
+                    if self._is_past(deadline, delay=delay):
+                        result = self._get_deadline_result(device_token)
+                        break
+                    await asyncio.sleep(delay)
+                    if phases is not None:
+                        add_phase_time(phases, PhaseStats.PHASE_QUEUE, delay)
+                    result = self._get_coalesced_result(device_token, ticket)
+                    if result is not None:
+                        break
+
+            result = self._get_circuit_open_result(device_token)
+            if result is not None:
+                break
+
+            attempt_time = time.time()
+            attempt_start_time = time.perf_counter()
+            connection, result = await self._attempt(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases)
+
+            # The deadline passed while waiting for a free slot, nothing was sent.
+            if connection is None or result.exception_class is None:
+                break
+
+            if self._rate_limiter is not None and issubclass(result.exception_class, exceptions.TooManyRequestsException):
+                self._rate_limiter.penalize(device_token)
+
+            next_retry = self._get_retry(exception_class=result.exception_class, retry=retry, start_time=start_time, deadline=deadline, attempt_duration=time.perf_counter() - attempt_start_time)
+            if next_retry is None:
+                break
+
+            action, delay = next_retry
+            if action == RetryPolicy.ACTION_RECONNECT:
+                await self._reset_client(connection=connection)
+            elif action == RetryPolicy.ACTION_REFRESH_AUTH_TOKEN:
+                self._refresh_auth_token(issued_before=attempt_time)
+            if delay:
+                await asyncio.sleep(delay)
+                if phases is not None:
+                    add_phase_time(phases, PhaseStats.PHASE_BACKOFF, delay)
+            retry += 1
+
+        return self._finish_result(result, start_time=start_time, phases=phases)
+
+    async def _attempt(self, headers, json_data, device_token, deadline=None, phases=None):
+        # Sends a single attempt over the least busy connection, within the concurrency window if there is one.
+        if phases is not None:
+            queue_start_time = time.perf_counter()
+        acquired_at = None
+        connection = None
+        try:
+            if self._concurrency_controller is not None:
+                acquired_at = await self._acquire_concurrency(deadline)
+            if (self._concurrency_controller is None or acquired_at is not None) and not self._is_past(deadline):
+                connection = self._pool.acquire()
+        finally:
+            if connection is None:
+                self._release_unsent(acquired_at)
+        if connection is None:
+            return None, self._get_deadline_result(device_token)
+
+        if phases is not None:
+            add_phase_time(phases, PhaseStats.PHASE_QUEUE, time.perf_counter() - queue_start_time)
+        if self._metrics is not None:
+            self._metrics.record_stream_started()
+        result = None
+        try:
+            timeout = self._get_request_timeout(deadline)
+            result = await self._push(client=connection.client, headers=headers, json_data=json_data, device_token=device_token, timeout=timeout, phases=phases)
+        finally:
+            self._pool.release(connection)
+            if self._metrics is not None:
+                self._metrics.record_stream_finished()
+            if acquired_at is not None:
+                self._release_concurrency(acquired_at, result)
+            if self._circuit_breaker is not None:
+                self._record_circuit(result)
+        return connection, result
+
+    async def _acquire_concurrency(self, deadline):
+        # Waits for a slot in the concurrency window, until the deadline at most. Returns the time
+        # it was admitted (to pass to `release`), None if the deadline passed first.
+        if deadline is None:
+            return await self._concurrency_controller.acquire_async()
+        try:
+            return await asyncio.wait_for(self._concurrency_controller.acquire_async(), timeout=self._get_remaining(deadline))
+        except asyncio.TimeoutError:
+            return None
+
+    async def _push(self, client, headers, json_data, device_token, timeout=httpx.USE_CLIENT_DEFAULT, phases=None):
+        if phases is not None:
+            phases_token = current_phases.set(phases)
+            network_start_time = time.perf_counter()
+        try:
+            response = await self._send_request(client=client, headers=headers, json_data=json_data, device_token=device_token, timeout=timeout)
+        except httpx.RequestError as e:
+            return self._get_connection_failure_result(device_token=device_token, exc=e)
+        finally:
+            if phases is not None:
+                add_phase_time(phases, PhaseStats.PHASE_NETWORK, time.perf_counter() - network_start_time)
+                current_phases.reset(phases_token)
+
+        if phases is None:
+            return self._get_result(response, device_token=device_token)
+
+        parse_start_time = time.perf_counter()
+        result = self._get_result(response, device_token=device_token)
+        add_phase_time(phases, PhaseStats.PHASE_PARSE, time.perf_counter() - parse_start_time)
+        return result
+
+    async def _send_request(self, client, headers, json_data, device_token, timeout=httpx.USE_CLIENT_DEFAULT):
+        url = self._get_url(device_token)
+        return await client.post(url, content=json_data, headers=headers, timeout=timeout)
+
+    async def _send_health_check(self, client):
+        # httpx has no API to send HTTP/2 PING frames, and httpcore discards PING acknowledgements
+        # while reading responses, so an unauthenticated request is sent instead. Any response (an
+        # error from APNs) shows that the connection works.
+        response = await client.get('/', auth=None)
+        logger.debug(f'Health check: {response.status_code}.')
+
+    def _create_client(self):
+        logger.debug('Creating a new async client instance.')
+        return httpx.AsyncClient(**self._get_client_kwargs())
+
+    async def _reset_client(self, connection=None):
+        # Only the failed connection is replaced, the others keep carrying traffic, and the other
+        # requests in flight on it complete before it is closed. Concurrent pushes failing on the
+        # same connection reset it just once, and only that push counts it. With the health checks
+        # running, the replacement is opened in the background.
+        reset = await self._pool.reset(connection)
+        if self._metrics is not None and connection is not None and reset:
+            self._metrics.record_connection_reset()
+        if self._keepalive_task is not None:
+            self._keepalive_wakeup.set()
+
+
+class _BackgroundSender:
+
+    def __init__(self, async_client, concurrency):
+        super().__init__()
+
+        self._async_client = async_client
+        self._concurrency = concurrency
+        self._semaphore = None
+
+        # The process the thread runs in, a forked process has to start its own sender.
+        self.pid = os.getpid()
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name='pyapns_client.background_sender', daemon=True)
+        self._thread.start()
+
+    def submit(self, headers, json_data, device_token, deadline=None, phases=None, bounded=True):
+        # Bounded pushes wait for one of the `concurrency` slots, unbounded ones are already
+        # limited by the caller (see APNSClient._map_concurrently).
+        return asyncio.run_coroutine_threadsafe(self._push(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases, bounded=bounded), self._loop)
+
+    def connect(self):
+        asyncio.run_coroutine_threadsafe(self._async_client.connect(), self._loop).result()
+
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self._async_client.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def stop(self):
+        # Like `close`, but doesn't wait. Called by the garbage collector (from any thread,
+        # possibly this sender's own) when the client is dropped without being closed.
+        if self.pid != os.getpid() or self._loop.is_closed():
+            return
+        future = asyncio.run_coroutine_threadsafe(self._async_client.close(), self._loop)
+        future.add_done_callback(lambda _: self._loop.call_soon_threadsafe(self._loop.stop))
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    async def _push(self, headers, json_data, device_token, deadline, phases, bounded):
+        if not bounded:
+            return await self._async_client._push_with_retries(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases)
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        if deadline is None:
+            await self._semaphore.acquire()
+        else:
+            # A push still waiting for a slot at its deadline fails without being sent.
+            start_time = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self._async_client._get_remaining(deadline))
+            except asyncio.TimeoutError:
+                return self._async_client._finish_result(self._async_client._get_deadline_result(device_token), start_time=start_time, phases=phases)
         try:
-            return getattr(exceptions, exception_class_name)
-        except AttributeError:
-            raise NotImplementedError(f'Reason not implemented: {reason}')
+            return await self._async_client._push_with_retries(headers=headers, json_data=json_data, device_token=device_token, deadline=deadline, phases=phases)
+        finally:
+            self._semaphore.release()
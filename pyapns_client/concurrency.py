@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+
+from . import exceptions
+from .logging import logger
+
+
+class _AsyncWaiter:
+
+    __slots__ = ('loop', 'future')
+
+    def __init__(self, loop):
+        super().__init__()
+
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def set(self):
+        # May be called from any thread, the future is resolved on its own event loop.
+        self.loop.call_soon_threadsafe(self._set_result)
+
+    def _set_result(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ConcurrencyController:
+
+    # Responses showing that APNs (or the connection to it) is overloaded, these shrink the window.
+    OVERLOAD_EXCEPTION_CLASSES = (
+        exceptions.TooManyRequestsException,
+        exceptions.ServiceUnavailableException,
+        exceptions.APNSConnectionException,
+    )
+
+    def __init__(self, initial=10, minimum=1, maximum=500, increase=1.0, decrease=0.5, latency_tolerance=2.0):
+        super().__init__()
+
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('The concurrency limits must satisfy 1 <= minimum <= initial <= maximum.')
+
+        # An AIMD window of in-flight requests: it grows by `increase` requests per round trip while
+        # the latency stays within `latency_tolerance` times the baseline, and is multiplied by
+        # `decrease` when APNs pushes back.
+        self._limit = float(initial)
+        self._minimum = minimum
+        self._maximum = maximum
+        self._increase = increase
+        self._decrease = decrease
+        self._latency_tolerance = latency_tolerance
+        self._baseline_latency = None
+        self._decreased_at = 0.0
+
+        # The number of concurrent streams the server allows over all the client's connections.
+        self._stream_limit = None
+
+        self._in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        limit = int(self._limit)
+        if self._stream_limit is not None:
+            limit = min(limit, self._stream_limit)
+        return max(limit, 1)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def stream_limit(self):
+        return self._stream_limit
+
+    @property
+    def maximum(self):
+        return self._maximum
+
+    def acquire(self):
+        # Blocks until a request may be sent, returns the time it was admitted (to pass to `release`).
+        with self._lock:
+            if self._try_acquire():
+                return time.monotonic()
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+        waiter.wait()
+        return time.monotonic()
+
+    async def acquire_async(self):
+        # asyncio is slow to import and only needed here, where the caller has already imported it.
+        import asyncio
+
+        with self._lock:
+            if self._try_acquire():
+                return time.monotonic()
+            waiter = _AsyncWaiter(loop=asyncio.get_running_loop())
+            self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    # The slot was already handed over to this waiter.
+                    self._release()
+            raise
+        return time.monotonic()
+
+    def release(self, acquired_at=None, exception_class=None):
+        # Frees the slot and adjusts the window to the outcome of the request. Without `acquired_at`
+        # (e.g. the request was cancelled) the window is left as is.
+        with self._lock:
+            if acquired_at is None:
+                pass
+            elif exception_class is not None and issubclass(exception_class, self.OVERLOAD_EXCEPTION_CLASSES):
+                self._on_overload(acquired_at)
+            else:
+                self._on_response(time.monotonic() - acquired_at)
+            self._release()
+
+    def set_stream_limit(self, stream_limit):
+        with self._lock:
+            if stream_limit != self._stream_limit:
+                logger.debug(f'Concurrent stream limit: {stream_limit}.')
+                self._stream_limit = stream_limit
+                self._wake()
+
+    def _try_acquire(self):
+        if self._waiters or self._in_flight >= self.limit:
+            return False
+        self._in_flight += 1
+        return True
+
+    def _release(self):
+        self._in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        # Hands the free slots over to the waiters in arrival order.
+        while self._waiters and self._in_flight < self.limit:
+            self._in_flight += 1
+            self._waiters.popleft().set()
+
+    def _on_response(self, latency):
+        # The baseline follows drops in latency immediately and increases slowly.
+        if self._baseline_latency is None or latency < self._baseline_latency:
+            self._baseline_latency = latency
+        else:
+            self._baseline_latency += (latency - self._baseline_latency) * 0.01
+
+        # The window only grows while it is used, an idle window says nothing about the capacity.
+        if latency <= self._baseline_latency * self._latency_tolerance and self._in_flight * 2 >= self._limit:
+            self._limit = min(self._limit + self._increase / self._limit, self._maximum)
+
+    def _on_overload(self, acquired_at):
+        # Requests sent before the last decrease were sent with the old window, they don't shrink it again.
+        if acquired_at < self._decreased_at:
+            return
+        self._limit = max(self._limit * self._decrease, self._minimum)
+        self._decreased_at = time.monotonic()
+        self.decreases += 1
+        logger.debug(f'Concurrency limit decreased to {self.limit}.')
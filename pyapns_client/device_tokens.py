@@ -0,0 +1,52 @@
+import re
+
+
+# Device tokens are hex strings, 32 bytes so far. Apple warns that the length may change, so
+# tokens of up to 100 bytes are accepted.
+_DEVICE_TOKEN_PATTERN = r'(?:[0-9a-f]{2}){32,100}'
+
+_DEVICE_TOKEN_RE = re.compile(_DEVICE_TOKEN_PATTERN)
+
+# The valid lengths and characters of normalized tokens, to check a whole batch at once.
+_DEVICE_TOKEN_LENGTHS = frozenset(range(64, 201, 2))
+_HEX_DIGITS = b'0123456789abcdef'
+
+# Whitespace and the angle brackets of an NSData description, e.g. '<740f4707 bebcf74f ...>'.
+_SEPARATORS_TABLE = str.maketrans('', '', ' \t\r\n<>')
+
+
+def normalize_device_token(device_token):
+    # Returns the device token as lowercase hex without separators, None if it isn't a valid token.
+    # Bytes are either the token as ASCII hex (e.g. read from a file or a database column), or the
+    # raw token bytes, which are hex encoded.
+    if isinstance(device_token, (bytes, bytearray)):
+        try:
+            normalized_device_token = normalize_device_token(device_token.decode('ascii'))
+        except UnicodeDecodeError:
+            normalized_device_token = None
+        if normalized_device_token is not None:
+            return normalized_device_token
+        device_token = device_token.hex()
+    elif not isinstance(device_token, str):
+        return None
+
+    if _DEVICE_TOKEN_RE.fullmatch(device_token):
+        return device_token
+
+    device_token = device_token.translate(_SEPARATORS_TABLE).lower()
+    if _DEVICE_TOKEN_RE.fullmatch(device_token):
+        return device_token
+    return None
+
+
+def normalize_device_tokens(device_tokens):
+    # The batch form of normalize_device_token, returns a list with None for the invalid tokens.
+    # Batches of normalized tokens (the common case) are checked at once, about 10 times faster
+    # than token by token: the set of their lengths, then all their characters in a single pass.
+    device_tokens = list(device_tokens)
+    try:
+        if set(map(len, device_tokens)) <= _DEVICE_TOKEN_LENGTHS and not ''.join(device_tokens).encode('ascii').translate(None, _HEX_DIGITS):
+            return device_tokens
+    except (TypeError, UnicodeEncodeError):
+        pass
+    return [normalize_device_token(device_token) for device_token in device_tokens]
@@ -1,5 +1,4 @@
-import pytz
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 # BASE
@@ -58,6 +57,14 @@ class APNSConnectionException(APNSServerException):
         super().__init__(status_code=None, apns_id=None)
 
 
+class APNSTimeoutException(APNSConnectionException):
+    """
+    Used when no response was received in time, or when the deadline of a push left no time for an attempt.
+    """
+
+    pass
+
+
 # APNS REASONS
 
 class BadCollapseIdException(APNSProgrammingException):
@@ -254,7 +261,7 @@ class UnregisteredException(APNSDeviceException):
     def timestamp_datetime(self):
         if not self.timestamp:
             return None
-        return datetime.fromtimestamp(self.timestamp / 1000, tz=pytz.utc)
+        return datetime.fromtimestamp(self.timestamp / 1000, tz=timezone.utc)
 
 
 class PayloadTooLargeException(APNSProgrammingException):
@@ -303,3 +310,11 @@ class ShutdownException(APNSServerException):
     """
 
     pass
+
+
+# Maps APNs reasons to their exception classes, e.g. 'BadDeviceToken' to BadDeviceTokenException.
+REASON_EXCEPTION_CLASSES = {
+    name[:-len('Exception')]: value
+    for name, value in list(globals().items())
+    if isinstance(value, type) and issubclass(value, APNSException) and not name.startswith('APNS')
+}
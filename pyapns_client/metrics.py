@@ -0,0 +1,173 @@
+import bisect
+import math
+import threading
+from collections import Counter
+
+
+class MetricsHook:
+
+    # Receives the client's events. Subclass it and override the events you need, e.g. to forward
+    # them to statsd or OpenTelemetry. Methods are called on the pushing threads (or event loop),
+    # so they must be thread-safe and must not block.
+
+    def record_push(self, result):
+        # Called with the PushResult of every push, after all the retries.
+        pass
+
+    def record_retry(self, action, exception_class):
+        pass
+
+    def record_connection_reset(self):
+        # Called when a connection is replaced after a failure.
+        pass
+
+    def record_stream_started(self):
+        pass
+
+    def record_stream_finished(self):
+        pass
+
+    def record_token_refresh(self):
+        # Called when the provider token (JWT) used by the client is replaced.
+        pass
+
+
+class _Histogram:
+
+    def __init__(self, buckets):
+        super().__init__()
+
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative_counts(self):
+        cumulative_counts = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative_counts.append(total)
+        return cumulative_counts
+
+
+class MetricsCollector(MetricsHook):
+
+    # Upper bounds (in seconds) of the push latency histogram buckets.
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self, latency_buckets=None):
+        super().__init__()
+
+        self._lock = threading.Lock()
+        self._latency = _Histogram(latency_buckets or self.LATENCY_BUCKETS)
+
+        # Pushes per status, and failures per (reason, exception class name).
+        self.pushes = Counter()
+        self.failures = Counter()
+
+        # Retries per (action, exception class name).
+        self.retries = Counter()
+
+        self.connection_resets = 0
+        self.streams = 0
+        self.token_refreshes = 0
+
+    def record_push(self, result):
+        with self._lock:
+            self.pushes[result.status] += 1
+            if result.latency is not None:
+                self._latency.observe(result.latency)
+            if not result.is_success and (result.reason is not None or result.exception_class is not None):
+                exception_name = result.exception_class.__name__ if result.exception_class is not None else ''
+                self.failures[result.reason or '', exception_name] += 1
+
+    def record_retry(self, action, exception_class):
+        with self._lock:
+            self.retries[action, exception_class.__name__] += 1
+
+    def record_connection_reset(self):
+        with self._lock:
+            self.connection_resets += 1
+
+    def record_stream_started(self):
+        with self._lock:
+            self.streams += 1
+
+    def record_stream_finished(self):
+        with self._lock:
+            self.streams -= 1
+
+    def record_token_refresh(self):
+        with self._lock:
+            self.token_refreshes += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'pushes': dict(self.pushes),
+                'failures': {f'{reason}:{exception_name}': count for (reason, exception_name), count in self.failures.items()},
+                'retries': {f'{action}:{exception_name}': count for (action, exception_name), count in self.retries.items()},
+                'connection_resets': self.connection_resets,
+                'streams': self.streams,
+                'token_refreshes': self.token_refreshes,
+                'latency_sum': self._latency.sum,
+                'latency_count': self._latency.count,
+            }
+
+    def to_prometheus(self, prefix='pyapns_client'):
+        # Returns the metrics in the Prometheus text exposition format.
+        with self._lock:
+            lines = []
+
+            name = f'{prefix}_push_latency_seconds'
+            lines.append(f'# HELP {name} Time spent on a push, including retries.')
+            lines.append(f'# TYPE {name} histogram')
+            for bucket, count in zip(self._latency.buckets + (math.inf,), self._latency.get_cumulative_counts()):
+                lines.append(f'{name}_bucket{{le="{_format_value(bucket)}"}} {count}')
+            lines.append(f'{name}_sum {_format_value(self._latency.sum)}')
+            lines.append(f'{name}_count {self._latency.count}')
+
+            name = f'{prefix}_pushes_total'
+            lines.append(f'# HELP {name} Pushes by status.')
+            lines.append(f'# TYPE {name} counter')
+            for status, count in sorted(self.pushes.items()):
+                lines.append(f'{name}{{status="{_escape_label(status)}"}} {count}')
+
+            name = f'{prefix}_push_failures_total'
+            lines.append(f'# HELP {name} Failed pushes by APNs reason and exception class.')
+            lines.append(f'# TYPE {name} counter')
+            for (reason, exception_name), count in sorted(self.failures.items()):
+                lines.append(f'{name}{{reason="{_escape_label(reason)}",exception="{exception_name}"}} {count}')
+
+            name = f'{prefix}_retries_total'
+            lines.append(f'# HELP {name} Retried attempts by action and exception class.')
+            lines.append(f'# TYPE {name} counter')
+            for (action, exception_name), count in sorted(self.retries.items()):
+                lines.append(f'{name}{{action="{action}",exception="{exception_name}"}} {count}')
+
+            for name, help_text, metric_type, value in (
+                (f'{prefix}_connection_resets_total', 'Connections replaced after a failure.', 'counter', self.connection_resets),
+                (f'{prefix}_streams_in_flight', 'Requests currently in flight.', 'gauge', self.streams),
+                (f'{prefix}_token_refreshes_total', 'Provider tokens (JWT) replaced.', 'counter', self.token_refreshes),
+            ):
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                lines.append(f'{name} {value}')
+
+            return '\n'.join(lines) + '\n'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
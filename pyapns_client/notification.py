@@ -1,5 +1,63 @@
 import json
-from math import floor
+import math
+import re
+
+from . import exceptions
+from .serializers import get_serializer
+
+
+def _dumps(value, default=None):
+    return get_serializer().dumps(value, default=default)
+
+
+def _encode_value(value):
+    # Same output as `_dumps`, with fast paths for the common scalar types.
+    value_type = type(value)
+    if value_type is str:
+        return json.encoder.encode_basestring_ascii(value).encode('ascii')
+    if value_type is int:
+        return str(value).encode('ascii')
+    if value_type is float and math.isfinite(value):
+        return repr(value).encode('ascii')
+    return _dumps(value)
+
+
+def _truncate(value, fits):
+    # Binary search for the longest prefix of the value which fits including the ellipsis.
+    # The encoded length grows monotonically with the prefix, so O(log n) encodings suffice.
+    low, high = 0, len(value) - 1
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(f'{value[:middle]}...'):
+            low = middle
+        else:
+            high = middle - 1
+    return f'{value[:low]}...'
+
+
+def _encode_headers(headers):
+    return tuple((name.lower().encode('ascii'), str(value).encode('ascii')) for name, value in headers.items())
+
+
+def _cast(value, cast):
+    if isinstance(value, PayloadSlot):
+        return value.with_cast(cast)
+    return cast(value)
+
+
+class PayloadSlot:
+
+    def __init__(self, name, cast=None):
+        super().__init__()
+
+        # Used as a keyword argument of `PayloadTemplate.render`.
+        self.name = name
+
+        # Applied to the rendered value before encoding, e.g. `int` for the badge.
+        self.cast = cast
+
+    def with_cast(self, cast):
+        return PayloadSlot(name=self.name, cast=cast)
 
 
 class _PayloadAlert:
@@ -76,7 +134,10 @@ class SafariPayloadAlert(_PayloadAlert):
 
 class _Payload:
 
-    MAX_PAYLOAD_SIZE = 2048
+    MAX_PAYLOAD_SIZE = 4096
+
+    # Stands in for the alert body while measuring the rest of the payload.
+    ALERT_BODY_PLACEHOLDER = '\x00pyapns_client.alert_body\x00'
 
     def __init__(self, alert=None, custom=None):
         super().__init__()
@@ -91,27 +152,47 @@ class _Payload:
         d.update(self.custom)
         return d
 
-    def to_json(self):
+    def to_json(self, max_size=None):
         # This method automatically truncates self.alert.body if it's long.
-        json_data = self._to_json()
+        if max_size is None:
+            max_size = self.MAX_PAYLOAD_SIZE
 
-        if self.alert and self.alert.body:
-            alert_body = self.alert.body
+        if not (self.alert and self.alert.body):
+            return self._to_json()
 
-            while alert_body:
-                extra_bytes = len(json_data) - self.MAX_PAYLOAD_SIZE
-                if extra_bytes <= 0:
-                    break
+        # The payload is serialized only once, with a placeholder in place of the alert body.
+        # The encoded body is then measured and spliced in, truncated if it doesn't fit.
+        json_data = self._to_json(alert_body=self.ALERT_BODY_PLACEHOLDER)
+        encoded_placeholder = self._encode_string(self.ALERT_BODY_PLACEHOLDER)
+        if json_data.count(encoded_placeholder) != 1:
+            return self._to_json_truncated(max_size=max_size)
 
-                chars_to_strip = max(1, floor(extra_bytes / 10))
-                alert_body = alert_body[:-chars_to_strip]
-                new_alert_body = f'{alert_body}...'
-                json_data = self._to_json(alert_body=new_alert_body)
+        available_size = max_size - len(json_data) + len(encoded_placeholder)
+        encoded_alert_body = self._encode_string(self.alert.body)
+        if len(encoded_alert_body) > available_size:
+            alert_body = _truncate(self.alert.body, fits=lambda alert_body: len(self._encode_string(alert_body)) <= available_size)
+            encoded_alert_body = self._encode_string(alert_body)
 
-        return json_data
+        return json_data.replace(encoded_placeholder, encoded_alert_body, 1)
+
+    def _to_json_truncated(self, max_size):
+        # Fallback for payloads which happen to contain the placeholder in their custom data.
+        json_data = self._to_json()
+        if len(json_data) <= max_size:
+            return json_data
+
+        alert_body = _truncate(self.alert.body, fits=lambda alert_body: len(self._to_json(alert_body=alert_body)) <= max_size)
+        return self._to_json(alert_body=alert_body)
+
+    def to_template(self, max_size=None):
+        return PayloadTemplate(payload=self, max_size=max_size)
 
     def _to_json(self, alert_body=None):
-        return json.dumps(self.to_dict(alert_body=alert_body), separators=(',', ':'), sort_keys=True).encode('utf-8')
+        return _dumps(self.to_dict(alert_body=alert_body))
+
+    @staticmethod
+    def _encode_string(value):
+        return _encode_value(value)
 
 
 class IOSPayload(_Payload):
@@ -132,7 +213,7 @@ class IOSPayload(_Payload):
     def to_dict(self, alert_body=None):
         d = super().to_dict(alert_body=alert_body)
         if self.badge is not None:
-            d['aps']['badge'] = int(self.badge)
+            d['aps']['badge'] = _cast(self.badge, int)
         if self.sound:
             d['aps']['sound'] = self.sound
         if self.category:
@@ -148,7 +229,7 @@ class IOSPayload(_Payload):
         if self.interruption_level:
             d['aps']['interruption-level'] = self.interruption_level
         if self.relevance_score is not None:
-            d['aps']['relevance-score'] = float(self.relevance_score)
+            d['aps']['relevance-score'] = _cast(self.relevance_score, float)
         return d
 
 
@@ -177,6 +258,12 @@ class _Notification:
     PUSH_TYPE_FILEPROVIDER = 'fileprovider'
     PUSH_TYPE_MDM = 'mdm'
 
+    # The maximum payload size in bytes, APNs allows more for VoIP notifications.
+    MAX_PAYLOAD_SIZE = 4096
+    MAX_PAYLOAD_SIZES = {
+        PUSH_TYPE_VOIP: 5120,
+    }
+
     def __init__(self, payload, topic, apns_id=None, collapse_id=None, expiration=None, priority=None, push_type=None):
         super().__init__()
 
@@ -238,8 +325,20 @@ class _Notification:
             headers['apns-push-type'] = self.push_type
         return headers
 
+    def get_max_payload_size(self):
+        return self.MAX_PAYLOAD_SIZES.get(self.push_type, self.MAX_PAYLOAD_SIZE)
+
     def get_json_data(self):
-        return self.payload.to_json()
+        return self.payload.to_json(max_size=self.get_max_payload_size())
+
+    def to_template(self):
+        return NotificationTemplate(notification=self)
+
+    def compile(self):
+        # Freezes the notification into pre-encoded headers and body which can be pushed
+        # repeatedly without serializing anything again. Later changes to the notification
+        # or its payload are not reflected in the compiled notification.
+        return CompiledNotification(headers=self.get_headers(), json_data=self.get_json_data())
 
 
 class IOSNotification(_Notification):
@@ -250,3 +349,149 @@ class IOSNotification(_Notification):
 class SafariNotification(_Notification):
 
     pass
+
+
+class CompiledNotification:
+
+    __slots__ = ('_headers', '_json_data')
+
+    def __init__(self, headers, json_data):
+        super().__init__()
+
+        # The headers are either a dict, or a tuple of already encoded (name, value) pairs.
+        if not isinstance(headers, tuple):
+            headers = _encode_headers(headers)
+
+        self._headers = headers
+        self._json_data = bytes(json_data)
+
+    def __setattr__(self, name, value):
+        if hasattr(self, name):
+            raise AttributeError(f'{type(self).__name__} is immutable.')
+        super().__setattr__(name, value)
+
+    def get_headers(self):
+        return self._headers
+
+    def get_json_data(self):
+        return self._json_data
+
+    def compile(self):
+        return self
+
+
+class PayloadTemplate:
+
+    # Stands in for a slot while serializing the static parts of the payload.
+    SLOT_PLACEHOLDER = '\x00pyapns_client.slot\x00{index}\x00'
+    SLOT_PLACEHOLDER_PATTERN = re.compile(rb'"\\u0000pyapns_client\.slot\\u0000(\d+)\\u0000"')
+
+    # Name of the internal slot a static alert body is rendered from, so that it is truncated like in `to_json`.
+    STATIC_ALERT_BODY_SLOT_NAME = '\x00pyapns_client.alert_body\x00'
+
+    def __init__(self, payload, max_size=None):
+        super().__init__()
+
+        self.max_size = max_size if max_size is not None else payload.MAX_PAYLOAD_SIZE
+
+        # The payload is serialized once with placeholders, then split into static encoded
+        # fragments interleaved with the slots.
+        slots = []
+
+        def encode_slot(slot):
+            if not isinstance(slot, PayloadSlot):
+                raise TypeError(f'Object of type {type(slot).__name__} is not JSON serializable')
+            slots.append(slot)
+            return self.SLOT_PLACEHOLDER.format(index=len(slots) - 1)
+
+        alert_body = payload.alert.body if payload.alert else None
+        self._static_values = {}
+        if isinstance(alert_body, str) and alert_body:
+            self._static_values[self.STATIC_ALERT_BODY_SLOT_NAME] = alert_body
+            alert_body = PayloadSlot(name=self.STATIC_ALERT_BODY_SLOT_NAME)
+        self._encoded_static_values = {name: _encode_value(value) for name, value in self._static_values.items()}
+
+        json_data = _dumps(payload.to_dict(alert_body=alert_body), default=encode_slot)
+        parts = self.SLOT_PLACEHOLDER_PATTERN.split(json_data)
+
+        self._fragments = parts[::2]
+        self._slots = [slots[int(index)] for index in parts[1::2]]
+        self._static_size = sum(len(fragment) for fragment in self._fragments)
+
+        # The first occurrence of each name decides its cast.
+        self._casts = {}
+        for slot in self._slots:
+            if slot.name not in self._static_values:
+                self._casts.setdefault(slot.name, slot.cast)
+        self._slot_order = [slot.name for slot in self._slots]
+
+        # Only an alert body (static or rendered from a slot) can be truncated.
+        self._alert_body_slot_name = alert_body.name if isinstance(alert_body, PayloadSlot) else None
+
+    @property
+    def slot_names(self):
+        return set(self._casts)
+
+    def render(self, **values):
+        encoded_values = self._encoded_static_values.copy()
+        for name, cast in self._casts.items():
+            value = values[name]
+            encoded_values[name] = _encode_value(cast(value) if cast else value)
+
+        fragments = self._fragments
+        parts = [fragments[0]]
+        size = self._static_size
+        for index, name in enumerate(self._slot_order, 1):
+            encoded_value = encoded_values[name]
+            size += len(encoded_value)
+            parts.append(encoded_value)
+            parts.append(fragments[index])
+
+        if size > self.max_size:
+            return self._render_truncated(encoded_values=encoded_values, values=values, size=size)
+
+        return b''.join(parts)
+
+    def _render_truncated(self, encoded_values, values, size):
+        # Unlike `to_json`, a payload which can't be truncated to the size limit is rejected here
+        # rather than by APNs.
+        name = self._alert_body_slot_name
+        if name is None:
+            raise exceptions.PayloadTooLargeException(status_code=None, apns_id=None)
+        if name in self._static_values:
+            alert_body = self._static_values[name]
+        else:
+            cast = self._casts[name]
+            alert_body = cast(values[name]) if cast else values[name]
+        if not (isinstance(alert_body, str) and alert_body):
+            raise exceptions.PayloadTooLargeException(status_code=None, apns_id=None)
+
+        occurrences = self._slot_order.count(name)
+        available_size = self.max_size - size + occurrences * len(encoded_values[name])
+        alert_body = _truncate(alert_body, fits=lambda alert_body: occurrences * len(_encode_value(alert_body)) <= available_size)
+        encoded_values[name] = _encode_value(alert_body)
+
+        parts = [self._fragments[0]]
+        for name, fragment in zip(self._slot_order, self._fragments[1:]):
+            parts.append(encoded_values[name])
+            parts.append(fragment)
+        json_data = b''.join(parts)
+        if len(json_data) > self.max_size:
+            raise exceptions.PayloadTooLargeException(status_code=None, apns_id=None)
+        return json_data
+
+
+class NotificationTemplate:
+
+    def __init__(self, notification):
+        super().__init__()
+
+        self._headers = _encode_headers(notification.get_headers())
+        self._payload_template = PayloadTemplate(payload=notification.payload, max_size=notification.get_max_payload_size())
+
+    @property
+    def slot_names(self):
+        return self._payload_template.slot_names
+
+    def render(self, **values):
+        return CompiledNotification(headers=self._headers, json_data=self._payload_template.render(**values))
@@ -0,0 +1,167 @@
+import asyncio
+import contextlib
+import time
+
+from .logging import logger
+
+
+class _Connection:
+
+    def __init__(self, client):
+        super().__init__()
+
+        # The httpx client owning exactly one HTTP/2 connection.
+        self.client = client
+
+        # The number of requests currently in flight on this connection.
+        self.streams = 0
+
+        # When the last request on this connection completed (time.monotonic()).
+        self.used_at = time.monotonic()
+
+        # Set when the connection was removed from the pool while requests were in flight on it,
+        # it is closed when the last one completes.
+        self.retired = False
+
+    @property
+    def max_streams(self):
+        # The number of concurrent streams the server allows (SETTINGS_MAX_CONCURRENT_STREAMS, capped
+        # by our own setting), read from httpcore internals. None until the connection is established.
+        try:
+            h2_state = self.client._transport._pool.connections[0]._connection._h2_state
+            return min(h2_state.remote_settings.max_concurrent_streams, h2_state.local_settings.max_concurrent_streams)
+        except (AttributeError, IndexError):
+            return None
+
+
+class _BaseConnectionPool:
+
+    LOCK_CLASS = None
+
+    def __init__(self, size, client_factory):
+        super().__init__()
+
+        if size < 1:
+            raise ValueError('The connection pool size must be at least 1.')
+
+        self._size = size
+        self._client_factory = client_factory
+        self._connections = [None] * size
+        self._lock = self.LOCK_CLASS()
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def streams(self):
+        return sum(connection.streams for connection in self._connections if connection is not None)
+
+    @property
+    def max_streams(self):
+        # The total number of concurrent streams the server allows over all the connections. Connections
+        # not established yet are assumed to get the same limit as the established ones.
+        limits = [connection.max_streams for connection in self._connections if connection is not None]
+        limits = [limit for limit in limits if limit is not None]
+        if not limits:
+            return None
+        return sum(limits) + max(limits) * (self._size - len(limits))
+
+    def acquire(self):
+        # Picks the connection with the fewest open streams. Idle open connections are
+        # preferred over empty slots, so new connections are only opened under load.
+        with self._lock:
+            index = min(range(self._size), key=self._get_slot_key)
+            connection = self._connections[index]
+            if connection is None:
+                logger.debug(f'Creating a new connection in slot {index}.')
+                connection = _Connection(client=self._client_factory())
+                self._connections[index] = connection
+
+            connection.streams += 1
+            return connection
+
+    def release(self, connection):
+        with self._lock:
+            connection.streams -= 1
+            connection.used_at = time.monotonic()
+
+    def acquire_idle(self, idle_time=0.0):
+        # Acquires the connections without requests in flight for at least `idle_time` seconds, for
+        # health checks. Empty slots are filled with new connections, so the whole pool gets opened.
+        acquired = []
+        with self._lock:
+            now = time.monotonic()
+            for index, connection in enumerate(self._connections):
+                if connection is None:
+                    logger.debug(f'Creating a new connection in slot {index}.')
+                    connection = _Connection(client=self._client_factory())
+                    self._connections[index] = connection
+                elif connection.streams or now - connection.used_at < idle_time:
+                    continue
+                connection.streams += 1
+                acquired.append(connection)
+        return acquired
+
+    def _get_slot_key(self, index):
+        connection = self._connections[index]
+        if connection is None:
+            return 0, 1
+        return connection.streams, 0
+
+    def _detach(self, connection=None):
+        # Removes a single connection (or all of them) from the pool and returns the removed ones.
+        detached = []
+        with self._lock:
+            for index, existing_connection in enumerate(self._connections):
+                if existing_connection is None:
+                    continue
+                if connection is None or existing_connection is connection:
+                    logger.debug(f'Resetting the connection in slot {index}.')
+                    self._connections[index] = None
+                    detached.append(existing_connection)
+        return detached
+
+
+class AsyncConnectionPool(_BaseConnectionPool):
+
+    # Only used from a single event loop, the pool is never modified across an `await`.
+    LOCK_CLASS = contextlib.nullcontext
+
+    def __init__(self, size, client_factory):
+        super().__init__(size=size, client_factory=client_factory)
+
+        # Reset connections waiting for their requests in flight to complete, and the tasks closing them.
+        self._retired = set()
+        self._closing_tasks = set()
+
+    def release(self, connection):
+        super().release(connection)
+        if connection.retired and not connection.streams:
+            logger.debug('Closing a reset connection after its last request.')
+            self._retired.discard(connection)
+            task = asyncio.ensure_future(connection.client.aclose())
+            self._closing_tasks.add(task)
+            task.add_done_callback(self._closing_tasks.discard)
+
+    async def reset(self, connection=None):
+        # Returns the number of connections removed, 0 if `connection` was already reset. New
+        # requests go to the other connections right away. The requests in flight on a single
+        # reset connection are left to complete (or fail) before it is closed, one failed stream
+        # doesn't abort the others. Resetting the whole pool closes all the connections at once.
+        detached = self._detach(connection)
+        for detached_connection in detached:
+            if connection is not None and detached_connection.streams:
+                detached_connection.retired = True
+                self._retired.add(detached_connection)
+            else:
+                await detached_connection.client.aclose()
+        return len(detached)
+
+    async def close(self):
+        await self.reset()
+        retired, self._retired = self._retired, set()
+        for connection in retired:
+            await connection.client.aclose()
+        if self._closing_tasks:
+            await asyncio.gather(*self._closing_tasks, return_exceptions=True)
@@ -0,0 +1,55 @@
+import contextvars
+import threading
+
+
+# The phase timings of the push being sent by the current thread or task, None when profiling is off.
+current_phases = contextvars.ContextVar('pyapns_client_current_phases', default=None)
+
+
+class PhaseStats:
+
+    # Time spent encoding the headers and the JSON payload.
+    PHASE_SERIALIZE = 'serialize'
+
+    # Time spent getting the provider token, including signing a new one.
+    PHASE_AUTH = 'auth'
+
+    # Time spent waiting for the rate limiter, a concurrency slot and a connection.
+    PHASE_QUEUE = 'queue'
+
+    # Time between sending the request and receiving the response (or the failure), without auth.
+    PHASE_NETWORK = 'network'
+
+    # Time spent decoding the response into a PushResult.
+    PHASE_PARSE = 'parse'
+
+    # Time spent sleeping between retries.
+    PHASE_BACKOFF = 'backoff'
+
+    def __init__(self):
+        super().__init__()
+
+        # The number of profiled pushes, and the total seconds spent in each phase over all of them.
+        self.pushes = 0
+        self.totals = {}
+
+        self._lock = threading.Lock()
+
+    def record(self, phases, push=True):
+        with self._lock:
+            if push:
+                self.pushes += 1
+            for phase, duration in phases.items():
+                self.totals[phase] = self.totals.get(phase, 0.0) + duration
+
+    def to_dict(self):
+        # The total and mean seconds per push spent in each phase.
+        with self._lock:
+            return {
+                phase: {'total': total, 'mean': total / self.pushes if self.pushes else 0.0}
+                for phase, total in self.totals.items()
+            }
+
+
+def add_phase_time(phases, phase, duration):
+    phases[phase] = phases.get(phase, 0.0) + duration
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class _DeviceWindow:
+
+    __slots__ = ('send_times', 'ticket')
+
+    def __init__(self, device_limit):
+        super().__init__()
+
+        # Scheduled send times of the last `device_limit` pushes to the device.
+        self.send_times = deque(maxlen=device_limit)
+
+        # Incremented for every push to the device, used to detect superseded pushes.
+        self.ticket = 0
+
+
+class RateLimiter:
+
+    # Pushes over the budget wait until they can be sent.
+    MODE_DELAY = 'delay'
+
+    # Like MODE_DELAY, but a waiting push is dropped if a newer push to the same device arrives
+    # before it is sent, so a device only receives the latest of a burst of notifications.
+    MODE_COALESCE = 'coalesce'
+
+    def __init__(self, rate=None, burst=None, device_limit=None, device_window=60.0, max_devices=100000, mode=MODE_DELAY):
+        super().__init__()
+
+        # A global token bucket of `burst` pushes refilled at `rate` pushes per second, implemented
+        # as a generic cell rate algorithm (a single timestamp instead of a refilling counter).
+        self._interval = 1 / rate if rate else None
+        self._tolerance = ((burst or rate or 1) - 1) * self._interval if rate else None
+        self._theoretical_arrival_time = 0.0
+
+        # At most `device_limit` pushes per device within a sliding `device_window` (in seconds).
+        # Only the `max_devices` most recently used devices are tracked.
+        self._device_limit = device_limit
+        self._device_window = device_window
+        self._max_devices = max_devices
+        self._devices = OrderedDict()
+
+        self.mode = mode
+        self._lock = threading.Lock()
+
+    def reserve(self, device_token):
+        # Reserves a send slot and returns a (delay, ticket) tuple, the caller waits `delay`
+        # seconds before sending. The ticket identifies the reservation in `is_superseded`.
+        with self._lock:
+            now = time.monotonic()
+            send_time = now
+            ticket = None
+
+            device_window = self._get_device_window(device_token)
+            if device_window is not None:
+                if len(device_window.send_times) == self._device_limit:
+                    send_time = max(send_time, device_window.send_times[0] + self._device_window)
+                device_window.ticket += 1
+
+            if self._interval is not None:
+                send_time = max(send_time, self._theoretical_arrival_time - self._tolerance)
+                self._theoretical_arrival_time = max(self._theoretical_arrival_time, send_time) + self._interval
+
+            if device_window is not None:
+                device_window.send_times.append(send_time)
+                ticket = (device_window.ticket, send_time)
+
+            return send_time - now, ticket
+
+    def is_superseded(self, device_token, ticket):
+        # True if the push holding `ticket` was delayed and a newer push to the same device
+        # has been reserved since, in MODE_COALESCE. The superseded push is dropped, so its
+        # reservation is released for later pushes.
+        if self.mode != self.MODE_COALESCE or ticket is None:
+            return False
+        number, send_time = ticket
+        with self._lock:
+            device_window = self._devices.get(device_token)
+            if device_window is None or device_window.ticket == number:
+                return False
+            try:
+                device_window.send_times.remove(send_time)
+            except ValueError:
+                # Already pushed out of the window by newer pushes.
+                pass
+            if self._interval is not None:
+                self._theoretical_arrival_time -= self._interval
+            return True
+
+    def penalize(self, device_token):
+        # Called after APNs returned TooManyRequests, the device gets no pushes for a full window.
+        with self._lock:
+            device_window = self._get_device_window(device_token)
+            if device_window is not None:
+                now = time.monotonic()
+                device_window.send_times.extend([now] * self._device_limit)
+
+    def _get_device_window(self, device_token):
+        if not self._device_limit:
+            return None
+
+        device_window = self._devices.get(device_token)
+        if device_window is None:
+            device_window = _DeviceWindow(device_limit=self._device_limit)
+            self._devices[device_token] = device_window
+            if len(self._devices) > self._max_devices:
+                self._devices.popitem(last=False)
+        else:
+            self._devices.move_to_end(device_token)
+        return device_window
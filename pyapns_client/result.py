@@ -0,0 +1,63 @@
+from . import exceptions
+
+
+class PushResult:
+
+    STATUS_SUCCESS = 'success'
+    STATUS_FAILURE = 'failure'
+
+    # APNs returned a reason this library doesn't know about, or a response without a valid JSON body.
+    STATUS_UNKNOWN = 'unknown'
+
+    # Not sent, a newer push to the same device superseded it (see RateLimiter.MODE_COALESCE).
+    STATUS_COALESCED = 'coalesced'
+
+    __slots__ = ('device_token', 'status', 'status_code', 'reason', 'apns_id', 'timestamp', 'latency', 'exception_class', 'phases')
+
+    def __init__(self, device_token, status, status_code=None, reason=None, apns_id=None, timestamp=None, latency=None, exception_class=None, phases=None):
+        super().__init__()
+
+        self.device_token = device_token
+        self.status = status
+
+        # The HTTP status code returned by APNs, None if no response was received.
+        self.status_code = status_code
+
+        # The APNs reason of a failure, e.g. 'BadDeviceToken'.
+        self.reason = reason
+
+        self.apns_id = apns_id
+
+        # The last time (in ms) at which APNs confirmed that the device token was no longer valid
+        # for the topic. Only set for Unregistered failures.
+        self.timestamp = timestamp
+
+        # Seconds spent on the push, including retries.
+        self.latency = latency
+
+        # The APNSException subclass matching the failure, None on success or for unknown reasons.
+        self.exception_class = exception_class
+
+        # Seconds spent in each phase of the push (see PhaseStats), only set when the client profiles phases.
+        self.phases = phases
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.device_token} {self.status} {self.status_code} {self.reason}>'
+
+    @property
+    def is_success(self):
+        return self.status == self.STATUS_SUCCESS
+
+    def to_exception(self):
+        # Builds the exception `push` raises for this result, None on success or if coalesced.
+        if self.is_success or self.status == self.STATUS_COALESCED:
+            return None
+        if self.exception_class is None:
+            if self.reason is None:
+                return NotImplementedError(f'Unexpected response: {self.status_code}')
+            return NotImplementedError(f'Reason not implemented: {self.reason}')
+        if issubclass(self.exception_class, exceptions.APNSConnectionException):
+            return self.exception_class()
+        if issubclass(self.exception_class, exceptions.UnregisteredException):
+            return self.exception_class(status_code=self.status_code, apns_id=self.apns_id, timestamp=self.timestamp)
+        return self.exception_class(status_code=self.status_code, apns_id=self.apns_id)
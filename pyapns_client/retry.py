@@ -0,0 +1,125 @@
+import random
+import threading
+
+from . import exceptions
+
+
+class RetryStats:
+
+    def __init__(self):
+        super().__init__()
+
+        # The number of retried attempts.
+        self.retries = 0
+
+        # The number of retries which replaced the connection first.
+        self.reconnects = 0
+
+        # The number of retries which created a new authentication token first.
+        self.auth_token_refreshes = 0
+
+        # The number of pushes which failed after a retryable error because the policy gave up.
+        self.exhausted = 0
+
+        # The total number of seconds spent sleeping between attempts.
+        self.backoff_time = 0.0
+
+        self._lock = threading.Lock()
+
+    def record_retry(self, action, delay):
+        with self._lock:
+            self.retries += 1
+            self.backoff_time += delay
+            if action == RetryPolicy.ACTION_RECONNECT:
+                self.reconnects += 1
+            elif action == RetryPolicy.ACTION_REFRESH_AUTH_TOKEN:
+                self.auth_token_refreshes += 1
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    def update(self, stats):
+        # Adds the counters of a `to_dict` snapshot, e.g. collected from another process.
+        with self._lock:
+            self.retries += stats['retries']
+            self.reconnects += stats['reconnects']
+            self.auth_token_refreshes += stats['auth_token_refreshes']
+            self.exhausted += stats['exhausted']
+            self.backoff_time += stats['backoff_time']
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'retries': self.retries,
+                'reconnects': self.reconnects,
+                'auth_token_refreshes': self.auth_token_refreshes,
+                'exhausted': self.exhausted,
+                'backoff_time': self.backoff_time,
+            }
+
+
+class RetryPolicy:
+
+    # Retry after a backoff delay on the same connection.
+    ACTION_BACKOFF = 'backoff'
+
+    # Replace the connection, then retry after a backoff delay.
+    ACTION_RECONNECT = 'reconnect'
+
+    # Create a new authentication token, then retry immediately.
+    ACTION_REFRESH_AUTH_TOKEN = 'refresh_auth_token'
+
+    # Exceptions are matched by their class hierarchy, so the most specific entry wins. A `None`
+    # action, or an exception not matching any entry, means the push is not retried at all.
+    DEFAULT_ACTIONS = {
+        exceptions.APNSServerException: ACTION_BACKOFF,
+        exceptions.APNSConnectionException: ACTION_RECONNECT,
+        exceptions.IdleTimeoutException: ACTION_RECONNECT,
+        exceptions.ShutdownException: ACTION_RECONNECT,
+        exceptions.ExpiredProviderTokenException: ACTION_REFRESH_AUTH_TOKEN,
+    }
+
+    def __init__(self, max_attempts=3, backoff_base=0.1, backoff_max=5.0, max_elapsed_time=30.0, actions=None):
+        super().__init__()
+
+        # The maximum number of attempts per push, including the first one.
+        self.max_attempts = max_attempts
+
+        # The exponential backoff delay (in seconds) is drawn uniformly from
+        # [0, min(backoff_max, backoff_base * 2 ** retry)] ("full jitter").
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # No retry is started if it would begin after this many seconds since the first attempt.
+        self.max_elapsed_time = max_elapsed_time
+
+        self.actions = {**self.DEFAULT_ACTIONS, **(actions or {})}
+
+    def get_action(self, exception_class):
+        if exception_class is None:
+            return None
+        for base_class in exception_class.__mro__:
+            if base_class in self.actions:
+                return self.actions[base_class]
+        return None
+
+    def get_delay(self, action, retry):
+        if action == self.ACTION_REFRESH_AUTH_TOKEN:
+            return 0.0
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def get_retry(self, exception_class, retry, elapsed_time):
+        # Returns an (action, delay) tuple for the next attempt, or None to give up.
+        if retry + 1 >= self.max_attempts:
+            return None
+
+        action = self.get_action(exception_class)
+        if action is None:
+            return None
+
+        delay = self.get_delay(action, retry)
+        if self.max_elapsed_time is not None and elapsed_time + delay > self.max_elapsed_time:
+            return None
+
+        return action, delay
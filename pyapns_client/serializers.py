@@ -0,0 +1,87 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Values of these exact types are encoded the same way by both serializers. orjson also encodes
+# datetimes, UUIDs, enums, dataclasses and numpy values natively, which the standard library rejects
+# (or hands to `default`), and their subclasses differently.
+_SCALAR_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _is_plain(value):
+    # True if `value` only contains dicts, lists and tuples of scalars of the exact types above.
+    # An explicit stack is about twice as fast as recursion here.
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        item_type = type(item)
+        if item_type is dict:
+            stack.extend(item.values())
+        elif item_type is list or item_type is tuple:
+            stack.extend(item)
+        elif item_type not in _SCALAR_TYPES:
+            return False
+    return True
+
+
+class JSONSerializer:
+
+    def dumps(self, value, default=None):
+        return json.dumps(value, separators=(',', ':'), sort_keys=True, default=default).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class OrjsonSerializer(JSONSerializer):
+
+    # Maps all digits to zero, so number patterns can be found with plain substring searches.
+    DIGITS_TABLE = bytes.maketrans(b'123456789', b'000000000')
+
+    def __init__(self):
+        super().__init__()
+
+        if orjson is None:
+            raise ImportError('orjson is not installed.')
+
+    def dumps(self, value, default=None):
+        # orjson differs from the standard library in a few places: it doesn't escape non-ASCII
+        # characters and DEL, it formats exponents and small floats differently, and it encodes
+        # NaN and Infinity as null. Output which may contain any of these is encoded again by
+        # the standard library, so both serializers always produce identical bytes. Values of other
+        # types (see _is_plain) go straight to the standard library, which hands them to `default`.
+        if not _is_plain(value):
+            return super().dumps(value, default=default)
+
+        try:
+            data = orjson.dumps(value, default=default, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # Integers out of the 64 bit range, non-string keys, ...
+            return super().dumps(value, default=default)
+
+        if data.isascii() and b'\x7f' not in data and b'null' not in data:
+            digits = data.translate(self.DIGITS_TABLE)
+            if b'0e' not in digits and b'0.0000' not in digits:
+                return data
+
+        return super().dumps(value, default=default)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+_serializer = OrjsonSerializer() if orjson is not None else JSONSerializer()
+
+
+def get_serializer():
+    return _serializer
+
+
+def set_serializer(serializer):
+    # Any object with the `dumps(value, default=None)` and `loads(data)` methods of JSONSerializer.
+    global _serializer
+    _serializer = serializer
@@ -0,0 +1,161 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .client import AsyncAPNSClient
+from .logging import logger
+from .metrics import MetricsHook
+from .retry import RetryStats
+
+
+class _WorkerMetrics(MetricsHook):
+
+    # Counts the events of a worker process, which are replayed into the parent's hook with
+    # every chunk. Pushes aren't counted, the parent records the results it receives.
+
+    def __init__(self):
+        super().__init__()
+
+        # The provider token may be refreshed on a background thread.
+        self._lock = threading.Lock()
+        self._events = Counter()
+
+    def record_retry(self, action, exception_class):
+        with self._lock:
+            self._events['record_retry', action, exception_class] += 1
+
+    def record_connection_reset(self):
+        with self._lock:
+            self._events[('record_connection_reset',)] += 1
+
+    def record_stream_started(self):
+        with self._lock:
+            self._events[('record_stream_started',)] += 1
+
+    def record_stream_finished(self):
+        with self._lock:
+            self._events[('record_stream_finished',)] += 1
+
+    def record_token_refresh(self):
+        with self._lock:
+            self._events[('record_token_refresh',)] += 1
+
+    def pop_events(self):
+        with self._lock:
+            events, self._events = self._events, Counter()
+        return events
+
+    @staticmethod
+    def replay(events, metrics_hook):
+        for (name, *args), count in events.items():
+            method = getattr(metrics_hook, name)
+            for _ in range(count):
+                method(*args)
+
+
+# The client, event loop and metrics owned by a worker process.
+_worker_client = None
+_worker_loop = None
+_worker_metrics = None
+
+
+def _init_worker(client_kwargs, record_metrics):
+    global _worker_client, _worker_loop, _worker_metrics
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+    _worker_metrics = _WorkerMetrics() if record_metrics else None
+    _worker_client = AsyncAPNSClient(metrics=_worker_metrics, **client_kwargs)
+
+
+def _push_chunk(notification, device_tokens, concurrency, deadline_time):
+    # The deadline is passed as a wall clock time, monotonic clocks may not be shared between processes.
+    deadline = deadline_time - time.time() if deadline_time is not None else None
+    retry_stats_before = _worker_client.retry_stats.to_dict()
+    results = _worker_loop.run_until_complete(_worker_client.push_many(notification=notification, device_tokens=device_tokens, concurrency=concurrency, deadline=deadline))
+    retry_stats_after = _worker_client.retry_stats.to_dict()
+    retry_stats = {name: retry_stats_after[name] - retry_stats_before[name] for name in retry_stats_after}
+    metrics_events = _worker_metrics.pop_events() if _worker_metrics is not None else None
+    return results, retry_stats, metrics_events
+
+
+class ShardedSender:
+
+    # Number of device tokens sent to a worker process at once.
+    CHUNK_SIZE = 1000
+
+    def __init__(self, processes=None, chunk_size=None, concurrency=None, **client_kwargs):
+        super().__init__()
+
+        # Every worker process owns an AsyncAPNSClient created from `client_kwargs` (the
+        # APNSClient arguments), with its own connections. Pass `token_cache_path` to have all
+        # the workers share a single provider token. The `metrics` hook stays in this process,
+        # the workers' events are replayed into it as their chunks complete.
+        self._metrics = client_kwargs.pop('metrics', None)
+        self._processes = processes or os.cpu_count() or 1
+        self._chunk_size = chunk_size or self.CHUNK_SIZE
+        self._concurrency = concurrency
+        self._client_kwargs = client_kwargs
+        self._executor = None
+
+        # Aggregated over all the workers.
+        self.outcomes = Counter()
+        self.retry_stats = RetryStats()
+
+    def push_many(self, notification, device_tokens, deadline=None):
+        # Splits the device tokens lazily into chunks spread across the worker processes and
+        # yields PushResult objects as the chunks complete. The notification is encoded once.
+        notification = notification.compile()
+        deadline_time = time.time() + deadline if deadline is not None else None
+        executor = self._get_executor()
+        chunks = self._iterate_chunks(device_tokens)
+
+        # Keeps every worker busy with a second chunk queued, without reading the whole audience.
+        max_pending = self._processes * 2
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from self._collect(done)
+            pending.add(executor.submit(_push_chunk, notification, chunk, self._concurrency, deadline_time))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from self._collect(done)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            logger.debug('Stopped the sharded sender.')
+
+    def _get_executor(self):
+        if self._executor is None:
+            logger.debug(f'Starting the sharded sender with {self._processes} processes.')
+            self._executor = ProcessPoolExecutor(max_workers=self._processes, initializer=_init_worker, initargs=(self._client_kwargs, self._metrics is not None))
+        return self._executor
+
+    def _iterate_chunks(self, device_tokens):
+        device_tokens = iter(device_tokens)
+        while True:
+            chunk = list(itertools.islice(device_tokens, self._chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _collect(self, futures):
+        for future in futures:
+            results, retry_stats, metrics_events = future.result()
+            self.retry_stats.update(retry_stats)
+            if self._metrics is not None:
+                _WorkerMetrics.replay(metrics_events, self._metrics)
+            for result in results:
+                if self._metrics is not None:
+                    self._metrics.record_push(result)
+                self.outcomes[result.status] += 1
+                if result.reason is not None:
+                    self.outcomes[f'reason:{result.reason}'] += 1
+                yield result
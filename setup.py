@@ -61,6 +61,8 @@ setup(
         'httpx[http2]',
         'PyJWT>=2',
         'cryptography',
-        'pytz',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
 )
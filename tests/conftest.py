@@ -0,0 +1,13 @@
+import pytest
+
+
+@pytest.fixture
+def auth_key_path(tmp_path):
+    # A provider token signing key, APNs is never reached with it.
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    auth_key = ec.generate_private_key(ec.SECP256R1())
+    path = tmp_path / 'auth_key.p8'
+    path.write_bytes(auth_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return str(path)
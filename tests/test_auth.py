@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+
+import pytest
+
+from pyapns_client import ProviderTokenManager
+from pyapns_client import auth
+
+
+class Clock:
+
+    # Stands in for the time module in pyapns_client.auth, `sleep` returns once the clock was advanced.
+
+    def __init__(self):
+        super().__init__()
+
+        self.now = 1700000000.0
+        self._condition = threading.Condition()
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._condition:
+            end = self.now + seconds
+            self._condition.wait_for(lambda: self.now >= end, timeout=1.0)
+
+    def advance(self, seconds):
+        with self._condition:
+            self.now += seconds
+            self._condition.notify_all()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(auth, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def create_manager(auth_key_path, clock):
+    with open(auth_key_path) as f:
+        auth_key = f.read()
+    managers = []
+
+    def create_manager(**kwargs):
+        manager = ProviderTokenManager(auth_key=auth_key, auth_key_id='KEYID', team_id='TEAMID', **kwargs)
+        managers.append(manager)
+        return manager
+
+    yield create_manager
+
+    # Lets the refresh threads see that their tokens aren't used anymore and exit.
+    for manager in managers:
+        manager._used = False
+    clock.advance(ProviderTokenManager.LIFETIME)
+    for manager in managers:
+        if manager._refresh_thread is not None and manager._refresh_thread_pid == os.getpid():
+            manager._refresh_thread.join(timeout=5.0)
+            assert not manager._refresh_thread.is_alive()
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + 5.0
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail('Timed out.')
+        time.sleep(0.01)
+
+
+def wait_for_child(pid):
+    deadline = time.monotonic() + 10.0
+    while True:
+        waited_pid, status = os.waitpid(pid, os.WNOHANG)
+        if waited_pid:
+            return os.waitstatus_to_exitcode(status)
+        if time.monotonic() > deadline:
+            os.kill(pid, 9)
+            os.waitpid(pid, 0)
+            pytest.fail('The forked process hung.')
+        time.sleep(0.01)
+
+
+def test_token_is_reused_until_it_expires(create_manager, clock):
+    manager = create_manager(background_refresh=False)
+    token = manager.token
+    assert manager.issued_at == clock.now
+
+    clock.advance(ProviderTokenManager.LIFETIME - 1)
+    assert manager.token == token
+    clock.advance(1)
+    assert manager.token != token
+    assert manager.created_tokens == 2
+
+
+def test_background_refresh(create_manager, clock):
+    manager = create_manager()
+    token = manager.token
+    issued_at = manager.issued_at
+    assert manager._refresh_thread.is_alive()
+
+    # Refreshed before it expires, off the request path.
+    clock.advance(ProviderTokenManager.LIFETIME - ProviderTokenManager.REFRESH_MARGIN)
+    wait_until(lambda: manager.created_tokens == 2)
+    assert manager.issued_at > issued_at
+    assert manager._storage[0] != token
+
+    # An unused token isn't refreshed again, the thread stops until the next read.
+    clock.advance(ProviderTokenManager.LIFETIME - ProviderTokenManager.REFRESH_MARGIN)
+    manager._refresh_thread.join(timeout=5.0)
+    assert not manager._refresh_thread.is_alive()
+    assert manager.created_tokens == 2
+
+    clock.advance(ProviderTokenManager.REFRESH_MARGIN)
+    manager.token
+    assert manager.created_tokens == 3
+    assert manager._refresh_thread.is_alive()
+
+
+def test_invalidate(create_manager, clock):
+    manager = create_manager(background_refresh=False)
+    token = manager.token
+    issued_at = manager.issued_at
+
+    # A request sent before the token was issued doesn't invalidate it.
+    manager.invalidate(issued_before=issued_at)
+    assert manager.token == token
+
+    clock.advance(1)
+    manager.invalidate(issued_before=clock.now)
+    assert manager.token != token
+    assert manager.created_tokens == 2
+
+    # Concurrent failures with the old token don't invalidate the new one.
+    manager.invalidate(issued_before=issued_at + 0.5)
+    assert manager.created_tokens == 2
+
+
+def test_cache_is_shared(create_manager, clock, tmp_path):
+    cache_path = str(tmp_path / 'token.json')
+    manager = create_manager(cache_path=cache_path, background_refresh=False)
+    other_manager = create_manager(cache_path=cache_path, background_refresh=False)
+    assert manager.token == other_manager.token
+    assert manager.created_tokens + other_manager.created_tokens == 1
+    assert oct(os.stat(cache_path).st_mode & 0o777) == '0o600'
+
+    # An invalidated token is replaced in the cache, the other manager picks up the new one.
+    clock.advance(1)
+    manager.invalidate(issued_before=clock.now)
+    other_manager.invalidate(issued_before=clock.now)
+    assert manager.token == other_manager.token
+    assert manager.created_tokens + other_manager.created_tokens == 2
+
+    # A cached token close to expiring isn't loaded, so it's not used after it expired.
+    clock.advance(ProviderTokenManager.LIFETIME - ProviderTokenManager.REFRESH_MARGIN)
+    token = manager.token
+    other_manager.reset()
+    assert other_manager.token != token
+    assert manager.created_tokens + other_manager.created_tokens == 3
+
+
+def test_cache_ignores_other_keys(create_manager, tmp_path):
+    cache_path = str(tmp_path / 'token.json')
+    manager = create_manager(cache_path=cache_path, background_refresh=False)
+    manager.token
+    other_manager = ProviderTokenManager(auth_key=manager._auth_key, auth_key_id='OTHERKEYID', team_id='TEAMID', cache_path=cache_path, background_refresh=False)
+    assert other_manager.token != manager.token
+    assert other_manager.created_tokens == 1
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork') or auth.fcntl is None, reason='requires fork() and fcntl')
+def test_cache_is_shared_between_processes(create_manager, tmp_path):
+    cache_path = str(tmp_path / 'token.json')
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(4):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(read_fd)
+                manager = create_manager(cache_path=cache_path, background_refresh=False)
+                manager.token
+                os.write(write_fd, f'{manager.created_tokens}\n'.encode())
+                status = 0
+            finally:
+                os._exit(status)
+        pids.append(pid)
+    os.close(write_fd)
+
+    assert [wait_for_child(pid) for pid in pids] == [0] * 4
+    with os.fdopen(read_fd) as f:
+        created_tokens = [int(line) for line in f]
+    # The file lock lets only one process create the token.
+    assert sorted(created_tokens) == [0, 0, 0, 1]
+
+    manager = create_manager(cache_path=cache_path, background_refresh=False)
+    manager.token
+    assert manager.created_tokens == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_refresh_thread_restarts_after_fork(create_manager):
+    manager = create_manager()
+    manager.token
+    assert manager._refresh_thread.is_alive()
+
+    pid = os.fork()
+    if pid == 0:
+        status = 1
+        try:
+            manager.token
+            status = 0 if manager._refresh_thread_pid == os.getpid() and manager._refresh_thread.is_alive() else 2
+        finally:
+            os._exit(status)
+
+    assert wait_for_child(pid) == 0
+    assert manager._refresh_thread_pid == os.getpid()
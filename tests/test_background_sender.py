@@ -0,0 +1,106 @@
+import gc
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from pyapns_client import APNSClient, APNSTimeoutException, IOSNotification, IOSPayload, IOSPayloadAlert
+
+
+mock_server = pytest.importorskip('benchmarks.mock_server')
+
+DEVICE_TOKEN = 'ab' * 32
+NOTIFICATION = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+
+@pytest.fixture
+def server():
+    with mock_server.MockAPNSServer() as server:
+        yield server
+
+
+def create_client(server, **kwargs):
+    return APNSClient(mode=APNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', base_url=server.url, **kwargs)
+
+
+def get_background_sender_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'pyapns_client.background_sender']
+
+
+def test_threads_share_one_client(server):
+    client = create_client(server, connections=1)
+    try:
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda _: client.try_push(NOTIFICATION, DEVICE_TOKEN), range(400)))
+    finally:
+        client.close()
+    assert all(result.is_success for result in results)
+    assert server.connections == 1
+    assert server.responses['Success'] == 400
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork()')
+def test_push_after_fork(server):
+    client = create_client(server)
+    try:
+        assert client.try_push(NOTIFICATION, DEVICE_TOKEN).is_success
+
+        pid = os.fork()
+        if pid == 0:
+            # The child must never return into pytest.
+            status = 1
+            try:
+                result = client.try_push(NOTIFICATION, DEVICE_TOKEN, deadline=5.0)
+                client.close()
+                status = 0 if result.is_success else 2
+            finally:
+                os._exit(status)
+
+        deadline = time.monotonic() + 10.0
+        while True:
+            waited_pid, status = os.waitpid(pid, os.WNOHANG)
+            if waited_pid:
+                break
+            if time.monotonic() > deadline:
+                os.kill(pid, 9)
+                os.waitpid(pid, 0)
+                pytest.fail('The push hung in the forked process.')
+            time.sleep(0.01)
+        assert os.waitstatus_to_exitcode(status) == 0
+
+        # The parent's sender and connections are left untouched.
+        assert client.try_push(NOTIFICATION, DEVICE_TOKEN).is_success
+    finally:
+        client.close()
+
+
+def test_dropped_clients_stop_their_sender(server):
+    threads_before = len(get_background_sender_threads())
+    for _ in range(5):
+        client = create_client(server)
+        assert client.try_push(NOTIFICATION, DEVICE_TOKEN).is_success
+        del client
+    gc.collect()
+
+    deadline = time.monotonic() + 5.0
+    while len(get_background_sender_threads()) > threads_before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(get_background_sender_threads()) == threads_before
+
+
+def test_deadline_bounds_the_submit_wait(monkeypatch):
+    monkeypatch.setattr(APNSClient, 'SUBMIT_CONCURRENCY', 1)
+    with mock_server.MockAPNSServer(latency=1.0) as server:
+        client = create_client(server)
+        try:
+            slow = client.submit(NOTIFICATION, DEVICE_TOKEN)
+            start_time = time.perf_counter()
+            result = client.submit(NOTIFICATION, DEVICE_TOKEN, deadline=0.2).result()
+            duration = time.perf_counter() - start_time
+            assert slow.result().is_success
+        finally:
+            client.close()
+    assert result.exception_class is APNSTimeoutException
+    assert duration < 0.8
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from pyapns_client import APNSClient, APNSTimeoutException, AsyncAPNSClient, CircuitBreaker, ConcurrencyController, IOSNotification, IOSPayload, IOSPayloadAlert, ServiceUnavailableException
+from pyapns_client import circuit
+
+
+class Clock:
+
+    def __init__(self):
+        super().__init__()
+
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def half_open_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=30.0)
+    breaker.record(ServiceUnavailableException)
+    assert breaker.state == CircuitBreaker.STATE_OPEN
+    clock.now += 30.0
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.STATE_HALF_OPEN
+    return breaker
+
+
+def test_single_probe(half_open_breaker):
+    assert not half_open_breaker.allow()
+    half_open_breaker.record(None)
+    assert half_open_breaker.state == CircuitBreaker.STATE_CLOSED
+
+
+def test_released_probe_is_replaced(half_open_breaker):
+    half_open_breaker.release()
+    assert half_open_breaker.state == CircuitBreaker.STATE_OPEN
+    assert half_open_breaker.allow()
+    assert not half_open_breaker.allow()
+
+
+def test_expired_probe_is_replaced(half_open_breaker, clock):
+    clock.now += 29.0
+    assert not half_open_breaker.allow()
+    clock.now += 1.0
+    assert half_open_breaker.allow()
+    assert not half_open_breaker.allow()
+
+
+def test_release_while_closed(clock):
+    breaker = CircuitBreaker()
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitBreaker.STATE_CLOSED
+
+
+@pytest.fixture
+def open_breaker():
+    # An open breaker ready to send a probe.
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.0)
+    breaker.record(ServiceUnavailableException)
+    return breaker
+
+
+@pytest.fixture
+def client_kwargs(auth_key_path, open_breaker):
+    return {'mode': APNSClient.MODE_DEV, 'root_cert_path': None, 'auth_key_path': auth_key_path, 'auth_key_id': 'KEYID', 'team_id': 'TEAMID', 'circuit_breaker': open_breaker}
+
+
+NOTIFICATION = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+DEVICE_TOKEN = 'ab' * 32
+
+
+def test_probe_past_deadline_is_released(client_kwargs, open_breaker):
+    client = APNSClient(**client_kwargs)
+    try:
+        result = client.try_push(NOTIFICATION, DEVICE_TOKEN, deadline=0.0)
+    finally:
+        client.close()
+    assert result.exception_class is APNSTimeoutException
+    assert open_breaker.state == CircuitBreaker.STATE_OPEN
+    assert open_breaker.allow()
+
+
+def test_probe_failing_to_get_a_connection_is_released(client_kwargs, open_breaker, monkeypatch):
+    def acquire():
+        raise OSError()
+
+    async def push():
+        client = AsyncAPNSClient(**client_kwargs)
+        monkeypatch.setattr(client._pool, 'acquire', acquire)
+        try:
+            with pytest.raises(OSError):
+                await client.try_push(NOTIFICATION, DEVICE_TOKEN)
+        finally:
+            await client.close()
+
+    asyncio.run(push())
+    assert open_breaker.state == CircuitBreaker.STATE_OPEN
+    assert open_breaker.allow()
+
+
+def test_async_probe_cancelled_while_queued_is_released(client_kwargs, open_breaker):
+    async def push():
+        # The only concurrency slot is taken, the probe waits for it until it is cancelled.
+        concurrency_controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+        client = AsyncAPNSClient(concurrency_controller=concurrency_controller, **client_kwargs)
+        acquired_at = await concurrency_controller.acquire_async()
+        try:
+            task = asyncio.ensure_future(client.try_push(NOTIFICATION, DEVICE_TOKEN))
+            await asyncio.sleep(0.01)
+            assert open_breaker.state == CircuitBreaker.STATE_HALF_OPEN
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        finally:
+            concurrency_controller.release(acquired_at)
+            await client.close()
+
+    asyncio.run(push())
+    assert open_breaker.state == CircuitBreaker.STATE_OPEN
+    assert open_breaker.allow()
@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from pyapns_client import APNSClient, APNSTimeoutException, AsyncAPNSClient, ConcurrencyController, IOSNotification, IOSPayload, IOSPayloadAlert, PushResult, UnregisteredException
+
+
+DEVICE_TOKEN = 'ab' * 32
+
+
+@pytest.fixture
+def client(auth_key_path):
+    client = APNSClient(mode=APNSClient.MODE_DEV, root_cert_path=None, auth_key_path=auth_key_path, auth_key_id='KEYID', team_id='TEAMID')
+    yield client
+    client.close()
+
+
+def test_get_result_success(client):
+    result = client._get_result(httpx.Response(200, headers={'apns-id': 'ID'}), DEVICE_TOKEN)
+    assert result.status == PushResult.STATUS_SUCCESS
+    assert result.apns_id == 'ID'
+
+
+def test_get_result_failure(client):
+    response = httpx.Response(410, headers={'apns-id': 'ID'}, json={'reason': 'Unregistered', 'timestamp': 1000})
+    result = client._get_result(response, DEVICE_TOKEN)
+    assert result.status == PushResult.STATUS_FAILURE
+    assert result.exception_class is UnregisteredException
+    assert result.timestamp == 1000
+
+
+def test_get_result_unknown_reason(client):
+    result = client._get_result(httpx.Response(400, json={'reason': 'SomethingNew'}), DEVICE_TOKEN)
+    assert result.status == PushResult.STATUS_UNKNOWN
+    assert result.reason == 'SomethingNew'
+    assert isinstance(result.to_exception(), NotImplementedError)
+
+
+@pytest.mark.parametrize('content', [b'', b'<html><body>502 Bad Gateway</body></html>', b'"reason"', b'\xff'])
+def test_get_result_invalid_body(client, content):
+    result = client._get_result(httpx.Response(502, headers={'apns-id': 'ID'}, content=content), DEVICE_TOKEN)
+    assert result.status == PushResult.STATUS_UNKNOWN
+    assert result.status_code == 502
+    assert result.apns_id == 'ID'
+    assert result.reason is None
+    assert str(result.to_exception()) == 'Unexpected response: 502'
+
+
+def test_connect_opens_the_connections_pushes_use():
+    mock_server = pytest.importorskip('benchmarks.mock_server')
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+    with mock_server.MockAPNSServer() as server:
+        client = APNSClient(mode=APNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', connections=2, base_url=server.url)
+        try:
+            client.connect()
+            assert server.connections == 2
+            client.push(notification, DEVICE_TOKEN)
+            assert all(result.is_success for result in client.push_many(notification, [DEVICE_TOKEN] * 10))
+            assert client.submit(notification, DEVICE_TOKEN).result().is_success
+        finally:
+            client.close()
+        assert server.connections == 2
+
+
+def test_deadline_bounds_the_concurrency_slot_wait():
+    mock_server = pytest.importorskip('benchmarks.mock_server')
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+    async def push(server):
+        concurrency_controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', concurrency_controller=concurrency_controller, base_url=server.url)
+        try:
+            await concurrency_controller.acquire_async()
+            start_time = time.perf_counter()
+            result = await client.try_push(notification, DEVICE_TOKEN, deadline=0.2)
+            duration = time.perf_counter() - start_time
+            concurrency_controller.release()
+            assert concurrency_controller.in_flight == 0
+            assert (await client.try_push(notification, DEVICE_TOKEN)).is_success
+        finally:
+            await client.close()
+        return result, duration
+
+    with mock_server.MockAPNSServer() as server:
+        result, duration = asyncio.run(asyncio.wait_for(push(server), timeout=10.0))
+    assert result.exception_class is APNSTimeoutException
+    assert duration < 1.0
+
+
+def test_keepalive_replaces_dead_idle_connections():
+    # The health check is an unauthenticated GET / (httpx has no API to send a PING), APNs answers it with an error.
+    mock_server = pytest.importorskip('benchmarks.mock_server')
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+    async def wait_until(predicate):
+        while not predicate():
+            await asyncio.sleep(0.01)
+
+    async def push(server):
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', keepalive_interval=0.1, base_url=server.url)
+        try:
+            await client.connect()
+            await wait_until(lambda: server.responses['BadPath'] >= 3)
+            assert server.connections == 1
+
+            # The server drops the idle connection, the next health check replaces it.
+            server._loop.call_soon_threadsafe(lambda: [protocol.abort() for protocol in list(server._protocols)])
+            await wait_until(lambda: server.connections == 2)
+            await wait_until(lambda: server._protocols)
+            assert (await client.try_push(notification, DEVICE_TOKEN)).is_success
+            assert client.retry_stats.retries == 0
+        finally:
+            await client.close()
+
+    with mock_server.MockAPNSServer() as server:
+        asyncio.run(asyncio.wait_for(push(server), timeout=10.0))
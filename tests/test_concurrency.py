@@ -0,0 +1,176 @@
+import asyncio
+
+import pytest
+
+from pyapns_client import AsyncAPNSClient, BadDeviceTokenException, ConcurrencyController, IOSNotification, IOSPayload, IOSPayloadAlert, ServiceUnavailableException, TooManyRequestsException
+from pyapns_client import concurrency
+
+
+class Clock:
+
+    def __init__(self):
+        super().__init__()
+
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(concurrency.time, 'monotonic', clock)
+    return clock
+
+
+def send_window(controller, clock, latency=0.01, exception_class=None):
+    # Fills the window, then gets all the responses after `latency` seconds.
+    acquired_ats = [controller.acquire() for _ in range(controller.limit)]
+    clock.now += latency
+    for acquired_at in acquired_ats:
+        controller.release(acquired_at, exception_class=exception_class)
+
+
+def test_additive_increase(clock):
+    controller = ConcurrencyController(initial=2, maximum=6)
+    limits = []
+    for _ in range(50):
+        send_window(controller, clock)
+        limits.append(controller.limit)
+    assert limits == sorted(limits)
+    assert limits[0] < 6
+    assert limits[-1] == 6
+    assert controller.in_flight == 0
+
+
+def test_no_increase_when_latency_rises(clock):
+    controller = ConcurrencyController(initial=4, maximum=100)
+    send_window(controller, clock, latency=0.01)
+    limit = controller._limit
+    for _ in range(10):
+        send_window(controller, clock, latency=0.05)
+    assert controller._limit == limit
+
+
+def test_no_increase_when_idle(clock):
+    controller = ConcurrencyController(initial=10, maximum=100)
+    for _ in range(50):
+        acquired_at = controller.acquire()
+        clock.now += 0.01
+        controller.release(acquired_at)
+    assert controller._limit == 10.0
+
+
+def test_multiplicative_decrease(clock):
+    controller = ConcurrencyController(initial=16, minimum=3, maximum=100)
+    for exception_class in [TooManyRequestsException, ServiceUnavailableException]:
+        acquired_at = controller.acquire()
+        clock.now += 0.01
+        controller.release(acquired_at, exception_class=exception_class)
+    assert controller.limit == 4
+    assert controller.decreases == 2
+
+    # Clamped to the minimum.
+    for _ in range(3):
+        acquired_at = controller.acquire()
+        clock.now += 0.01
+        controller.release(acquired_at, exception_class=TooManyRequestsException)
+    assert controller.limit == 3
+
+    # Other failures are ordinary responses.
+    acquired_at = controller.acquire()
+    clock.now += 0.01
+    controller.release(acquired_at, exception_class=BadDeviceTokenException)
+    assert controller.limit == 3
+
+
+def test_decrease_once_per_window(clock):
+    controller = ConcurrencyController(initial=16, maximum=100)
+    send_window(controller, clock, exception_class=TooManyRequestsException)
+    # The 16 requests were all sent before the first decrease.
+    assert controller.limit == 8
+    assert controller.decreases == 1
+
+    clock.now += 0.01
+    send_window(controller, clock, exception_class=TooManyRequestsException)
+    assert controller.limit == 4
+    assert controller.decreases == 2
+
+
+def test_release_without_acquired_at(clock):
+    controller = ConcurrencyController(initial=4, maximum=100)
+    controller.acquire()
+    controller.release()
+    assert controller._limit == 4.0
+    assert controller.in_flight == 0
+
+
+def test_stream_limit_clamps_the_window():
+    async def acquire():
+        controller = ConcurrencyController(initial=10, maximum=100)
+        controller.set_stream_limit(3)
+        assert controller.limit == 3
+        for _ in range(3):
+            await controller.acquire_async()
+        task = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        assert not task.done()
+
+        # Raising the stream limit wakes the waiter.
+        controller.set_stream_limit(4)
+        await asyncio.wait_for(task, timeout=1.0)
+        assert controller.in_flight == 4
+        controller.set_stream_limit(None)
+        assert controller.limit == 10
+
+    asyncio.run(acquire())
+
+
+def test_cancelled_waiter_gives_back_its_slot():
+    async def acquire():
+        controller = ConcurrencyController(initial=1, minimum=1, maximum=1)
+        await controller.acquire_async()
+
+        # Cancelled while waiting.
+        task = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.in_flight == 1
+
+        # Cancelled after the slot was handed over, but before it was resumed.
+        task = asyncio.ensure_future(controller.acquire_async())
+        await asyncio.sleep(0.01)
+        controller.release()
+        assert controller.in_flight == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert controller.in_flight == 0
+
+        await asyncio.wait_for(controller.acquire_async(), timeout=1.0)
+        assert controller.in_flight == 1
+
+    asyncio.run(acquire())
+
+
+def test_stream_limit_is_read_from_the_connection():
+    # Reads httpcore internals, this fails if a new httpcore version moves them.
+    mock_server = pytest.importorskip('benchmarks.mock_server')
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+    async def push(server):
+        controller = ConcurrencyController(initial=10, maximum=100)
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', connections=2, concurrency_controller=controller, base_url=server.url)
+        try:
+            assert client._pool.max_streams is None
+            assert (await client.try_push(notification, 'ab' * 32)).is_success
+            connection = next(connection for connection in client._pool._connections if connection is not None)
+            return connection.max_streams, client._pool.max_streams, controller.stream_limit
+        finally:
+            await client.close()
+
+    with mock_server.MockAPNSServer(max_concurrent_streams=7) as server:
+        assert asyncio.run(asyncio.wait_for(push(server), timeout=10.0)) == (7, 14, 14)
@@ -0,0 +1,41 @@
+import pytest
+
+from pyapns_client import normalize_device_token, normalize_device_tokens
+
+
+DEVICE_TOKEN = '740f4707bebcf74f9b7c25d48e3358945f6aa01da5ddb387462c7eaf61bb78ad'
+
+
+@pytest.mark.parametrize('device_token', [
+    DEVICE_TOKEN,
+    DEVICE_TOKEN.upper(),
+    '<740f4707 bebcf74f 9b7c25d4 8e335894 5f6aa01d a5ddb387 462c7eaf 61bb78ad>',
+    f' {DEVICE_TOKEN}\n',
+    DEVICE_TOKEN.encode(),
+    DEVICE_TOKEN.upper().encode(),
+    bytearray(DEVICE_TOKEN.encode()),
+    b'<740f4707 bebcf74f 9b7c25d4 8e335894 5f6aa01d a5ddb387 462c7eaf 61bb78ad>',
+    bytes.fromhex(DEVICE_TOKEN),
+    bytearray.fromhex(DEVICE_TOKEN),
+])
+def test_normalize_device_token(device_token):
+    assert normalize_device_token(device_token) == DEVICE_TOKEN
+
+
+def test_normalize_ascii_hex_bytes():
+    assert normalize_device_token(b'ab' * 32) == 'ab' * 32
+
+
+def test_normalize_raw_bytes():
+    # Raw bytes which happen to decode as ASCII, but not as hex.
+    assert normalize_device_token(b'zz' * 32) == '7a' * 64
+
+
+@pytest.mark.parametrize('device_token', [None, 1, '', 'ab' * 31, 'ab' * 101, 'zz' * 32, DEVICE_TOKEN[:-1], b'', b'\xab' * 31])
+def test_normalize_invalid_device_token(device_token):
+    assert normalize_device_token(device_token) is None
+
+
+def test_normalize_device_tokens():
+    assert normalize_device_tokens([DEVICE_TOKEN, DEVICE_TOKEN]) == [DEVICE_TOKEN, DEVICE_TOKEN]
+    assert normalize_device_tokens([DEVICE_TOKEN.upper(), b'ab' * 32, bytes.fromhex(DEVICE_TOKEN), 'zz']) == [DEVICE_TOKEN, 'ab' * 32, DEVICE_TOKEN, None]
@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+
+import pyapns_client
+
+
+# Only imported when a client is used (or, for asyncio, when an async API is).
+LAZY_MODULES = ('httpx', 'jwt', 'asyncio')
+
+
+def get_imported_modules(code):
+    # Runs `code` in a fresh interpreter, where nothing has been imported yet.
+    script = f'import json, sys\n{code}\nprint(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))'
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(os.path.abspath(pyapns_client.__file__))))
+    output = subprocess.run([sys.executable, '-c', script], env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def test_import_is_lazy():
+    assert get_imported_modules('import pyapns_client') == []
+
+
+def test_payloads_dont_import_the_clients():
+    code = "from pyapns_client import IOSNotification, IOSPayload, IOSPayloadAlert\nIOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app').get_json_data()"
+    assert get_imported_modules(code) == []
+
+
+def test_client_imports_httpx():
+    # PyJWT is only imported when the first provider token is signed.
+    assert 'httpx' in get_imported_modules('from pyapns_client import APNSClient')
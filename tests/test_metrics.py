@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from pyapns_client import AsyncAPNSClient, IOSNotification, IOSPayload, IOSPayloadAlert, MetricsCollector, PushResult, RetryPolicy, ShardedSender
+
+
+def test_connection_reset_is_counted_once(auth_key_path):
+    metrics = MetricsCollector()
+
+    async def reset():
+        # Two pushes failing on the same connection both reset it, only the first one replaces it.
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=None, auth_key_path=auth_key_path, auth_key_id='KEYID', team_id='TEAMID', metrics=metrics)
+        connection = client._pool.acquire()
+        client._pool.release(connection)
+        try:
+            await asyncio.gather(client._reset_client(connection=connection), client._reset_client(connection=connection))
+        finally:
+            await client.close()
+
+    asyncio.run(reset())
+    assert metrics.to_dict()['connection_resets'] == 1
+
+
+def test_sharded_sender_collects_worker_metrics():
+    mock_server = pytest.importorskip('benchmarks.mock_server')
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+    device_tokens = [f'{index:064x}' for index in range(200)]
+    metrics = MetricsCollector()
+    with mock_server.MockAPNSServer(errors={'Unregistered': 0.1, 'InternalServerError': 0.1}, seed=0) as server:
+        sender = ShardedSender(processes=2, chunk_size=50, mode='dev', root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', base_url=server.url, retry_policy=RetryPolicy(backoff_base=0.001), metrics=metrics)
+        try:
+            results = list(sender.push_many(notification, device_tokens))
+        finally:
+            sender.close()
+
+    stats = metrics.to_dict()
+    assert len(results) == 200
+    assert sum(stats['pushes'].values()) == 200
+    assert stats['pushes'][PushResult.STATUS_SUCCESS] == sender.outcomes[PushResult.STATUS_SUCCESS]
+    assert stats['failures']['Unregistered:UnregisteredException'] == sender.outcomes['reason:Unregistered']
+    assert sum(stats['retries'].values()) == sender.retry_stats.retries > 0
+    assert stats['streams'] == 0
+    assert stats['latency_count'] == 200
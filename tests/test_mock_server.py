@@ -0,0 +1,32 @@
+import asyncio
+import gc
+import logging
+
+import pytest
+
+from pyapns_client import APNSTimeoutException, AsyncAPNSClient, IOSNotification, IOSPayload, IOSPayloadAlert
+
+
+mock_server = pytest.importorskip('benchmarks.mock_server')
+
+
+def test_stop_cancels_pending_responses(caplog):
+    notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+    async def push(server):
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', base_url=server.url)
+        try:
+            return await client.try_push(notification, 'ab' * 32, deadline=0.3)
+        finally:
+            await client.close()
+
+    with caplog.at_level(logging.ERROR, logger='asyncio'):
+        with mock_server.MockAPNSServer(latency=5.0) as server:
+            result = asyncio.run(push(server))
+            assert server._tasks
+        assert not server._tasks
+        del server
+        gc.collect()
+
+    assert result.exception_class is APNSTimeoutException
+    assert 'Task was destroyed but it is pending' not in caplog.text
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+
+from pyapns_client import IOSNotification, IOSPayload, IOSPayloadAlert, PayloadSlot, PayloadTooLargeException
+from pyapns_client.notification import _Payload
+
+
+TOPIC = 'com.example.app'
+BODIES = ['x' * 5000, 'é' * 3000, '漢字' * 1000, '😀' * 1000, '"\\\n\t' * 1000, 'a😀"é\x01' * 500]
+
+
+def get_payload(body, custom=None):
+    return IOSPayload(alert=IOSPayloadAlert(title='Title', body=body), badge=1, custom=custom)
+
+
+def assert_truncated(body, json_data, max_size, custom=None):
+    # The body was cut to the longest prefix which fits with the ellipsis.
+    assert len(json_data) <= max_size
+    truncated_body = json.loads(json_data)['aps']['alert']['body']
+    assert truncated_body.endswith('...')
+    prefix = truncated_body[:-3]
+    assert body.startswith(prefix)
+    longer_body = f'{body[:len(prefix) + 1]}...'
+    assert len(get_payload(longer_body, custom=custom).to_json(max_size=10 ** 6)) > max_size
+
+
+def test_to_json_short_body_is_not_truncated():
+    json_data = get_payload('Hello "world" é😀').to_json()
+    assert json.loads(json_data)['aps']['alert']['body'] == 'Hello "world" é😀'
+
+
+@pytest.mark.parametrize('body', BODIES)
+def test_to_json_truncates_to_the_longest_prefix(body):
+    assert_truncated(body, get_payload(body).to_json(), 4096)
+
+
+@pytest.mark.parametrize('body', BODIES)
+@pytest.mark.parametrize('max_size', [200, 1000, 4096])
+def test_to_json_truncates_to_max_size(body, max_size):
+    assert_truncated(body, get_payload(body).to_json(max_size=max_size), max_size)
+
+
+def test_to_json_fits_the_body_exactly():
+    body = 'x' * (4096 - len(get_payload('x').to_json()) + 1)
+    assert len(get_payload(body).to_json()) == 4096
+    assert json.loads(get_payload(body).to_json())['aps']['alert']['body'] == body
+    assert_truncated(f'{body}x', get_payload(f'{body}x').to_json(), 4096)
+
+
+@pytest.mark.parametrize('push_type, max_size', [(None, 4096), (IOSNotification.PUSH_TYPE_BACKGROUND, 4096), (IOSNotification.PUSH_TYPE_VOIP, 5120)])
+def test_to_json_uses_the_push_type_limit(push_type, max_size):
+    body = 'é' * 6000
+    notification = IOSNotification(payload=get_payload(body), topic=TOPIC, push_type=push_type)
+    assert notification.get_max_payload_size() == max_size
+    assert_truncated(body, notification.get_json_data(), max_size)
+    assert_truncated(body, notification.compile().get_json_data(), max_size)
+
+
+@pytest.mark.parametrize('body', ['Hello', 'é' * 3000])
+def test_to_json_placeholder_collision(body):
+    # The custom data contains the placeholder, so the payload is truncated without splicing.
+    custom = {'data': _Payload.ALERT_BODY_PLACEHOLDER}
+    json_data = get_payload(body, custom=custom).to_json()
+    assert json.loads(json_data)['data'] == _Payload.ALERT_BODY_PLACEHOLDER
+    if len(body) < 100:
+        assert json.loads(json_data)['aps']['alert']['body'] == body
+    else:
+        assert_truncated(body, json_data, 4096, custom=custom)
+
+
+@pytest.mark.parametrize('body', ['Hello', 'x' * 5000, 'é' * 2000, '"\\\n' * 2000, '😀' * 1000])
+def test_render_static_body_matches_to_json(body):
+    payload = IOSPayload(alert=IOSPayloadAlert(title='Title', body=body), custom={'id': PayloadSlot('id')})
+    json_data = IOSPayload(alert=IOSPayloadAlert(title='Title', body=body), custom={'id': 'a'}).to_json()
+    assert payload.to_template().render(id='a') == json_data
+    assert len(json_data) <= 4096
+
+
+@pytest.mark.parametrize('body', ['Hello', 'x' * 5000, 'é' * 2000, '"\\\n' * 2000, '😀' * 1000])
+def test_render_body_slot_matches_to_json(body):
+    payload = IOSPayload(alert=IOSPayloadAlert(title='Title', body=PayloadSlot('body')), badge=PayloadSlot('badge'), custom={'id': PayloadSlot('id')})
+    json_data = IOSPayload(alert=IOSPayloadAlert(title='Title', body=body), badge=3, custom={'id': 'a' * 100}).to_json()
+    assert payload.to_template().render(body=body, badge='3', id='a' * 100) == json_data
+
+
+def test_render_truncates_the_cast_body():
+    payload = IOSPayload(alert=IOSPayloadAlert(body=PayloadSlot('body', cast=str)))
+    assert payload.to_template().render(body=12345) == IOSPayload(alert=IOSPayloadAlert(body='12345')).to_json()
+    json_data = payload.to_template(max_size=40).render(body=10 ** 100)
+    assert json_data == IOSPayload(alert=IOSPayloadAlert(body=str(10 ** 100))).to_json(max_size=40)
+    assert len(json_data) <= 40
+
+
+def test_render_uses_the_notification_size_limit():
+    body = 'x' * 6000
+    for push_type in [None, IOSNotification.PUSH_TYPE_VOIP]:
+        template = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body=PayloadSlot('body'))), topic=TOPIC, push_type=push_type).to_template()
+        notification = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body=body)), topic=TOPIC, push_type=push_type)
+        assert template.render(body=body).get_json_data() == notification.get_json_data()
+
+
+def test_render_without_body_raises_when_too_large():
+    template = IOSPayload(custom={'data': PayloadSlot('data')}).to_template()
+    assert len(template.render(data='x' * 100)) < 4096
+    with pytest.raises(PayloadTooLargeException):
+        template.render(data='x' * 5000)
+
+
+def test_render_raises_when_truncation_is_not_enough():
+    template = IOSPayload(alert=IOSPayloadAlert(body='Hello'), custom={'data': PayloadSlot('data')}).to_template()
+    with pytest.raises(PayloadTooLargeException):
+        template.render(data='x' * 5000)
+
+
+def test_slot_names_exclude_the_static_body():
+    template = IOSPayload(alert=IOSPayloadAlert(body='Hello'), custom={'id': PayloadSlot('id')}).to_template()
+    assert template.slot_names == {'id'}
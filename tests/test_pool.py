@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from pyapns_client import AsyncAPNSClient, IOSNotification, IOSPayload, IOSPayloadAlert, MetricsCollector
+
+
+mock_server = pytest.importorskip('benchmarks.mock_server')
+
+DEVICE_TOKEN = 'ab' * 32
+NOTIFICATION = IOSNotification(payload=IOSPayload(alert=IOSPayloadAlert(body='Hello')), topic='com.example.app')
+
+
+def test_reset_lets_the_streams_in_flight_complete():
+    metrics = MetricsCollector()
+
+    async def push(server):
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', base_url=server.url, connections=1, metrics=metrics)
+        try:
+            await client.connect()
+            connection = client._pool._connections[0]
+
+            tasks = [asyncio.ensure_future(client.try_push(NOTIFICATION, DEVICE_TOKEN)) for _ in range(50)]
+            while connection.streams < 50:
+                await asyncio.sleep(0.01)
+            await client._reset_client(connection=connection)
+            assert not connection.client.is_closed
+
+            # New pushes go to a new connection.
+            assert (await client.try_push(NOTIFICATION, DEVICE_TOKEN)).is_success
+            assert client._pool._connections[0] is not connection
+
+            results = await asyncio.gather(*tasks)
+            assert all(result.is_success for result in results)
+            await asyncio.sleep(0.01)
+            assert connection.client.is_closed
+        finally:
+            await client.close()
+
+    with mock_server.MockAPNSServer(latency=0.2) as server:
+        asyncio.run(asyncio.wait_for(push(server), timeout=10.0))
+        assert server.connections == 2
+        assert server.responses['Success'] == 51
+    assert metrics.to_dict()['connection_resets'] == 1
+
+
+def test_close_closes_reset_connections():
+    async def push(server):
+        client = AsyncAPNSClient(mode=AsyncAPNSClient.MODE_DEV, root_cert_path=server.cert_path, auth_key_path=server.auth_key_path, auth_key_id='KEYID', team_id='TEAMID', base_url=server.url, connections=1)
+        task = asyncio.ensure_future(client.try_push(NOTIFICATION, DEVICE_TOKEN))
+        while not client._pool.streams:
+            await asyncio.sleep(0.01)
+        connection = client._pool._connections[0]
+        await client._reset_client(connection=connection)
+        await client.close()
+        assert connection.client.is_closed
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    with mock_server.MockAPNSServer(latency=1.0) as server:
+        asyncio.run(asyncio.wait_for(push(server), timeout=10.0))
@@ -0,0 +1,119 @@
+import pytest
+
+from pyapns_client import RateLimiter
+from pyapns_client import ratelimit
+
+
+class Clock:
+
+    def __init__(self):
+        super().__init__()
+
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+def get_delays(rate_limiter, device_tokens):
+    return [rate_limiter.reserve(device_token)[0] for device_token in device_tokens]
+
+
+def test_global_bucket(clock):
+    rate_limiter = RateLimiter(rate=10, burst=3)
+    assert get_delays(rate_limiter, 'abcde') == pytest.approx([0.0, 0.0, 0.0, 0.1, 0.2])
+
+    # The bucket refills at `rate` pushes per second, up to `burst`.
+    clock.now += 0.5
+    assert get_delays(rate_limiter, 'ab') == pytest.approx([0.0, 0.0])
+    clock.now += 10.0
+    assert get_delays(rate_limiter, 'abcd') == pytest.approx([0.0, 0.0, 0.0, 0.1])
+
+
+def test_device_window(clock):
+    rate_limiter = RateLimiter(device_limit=2, device_window=60.0)
+    assert get_delays(rate_limiter, 'aaab') == [0.0, 0.0, 60.0, 0.0]
+    assert get_delays(rate_limiter, 'a') == [60.0]
+
+    clock.now += 30.0
+    assert get_delays(rate_limiter, 'a') == [90.0]
+    clock.now += 150.0
+    assert get_delays(rate_limiter, 'aa') == [0.0, 0.0]
+
+
+def test_device_lru(clock):
+    rate_limiter = RateLimiter(device_limit=1, device_window=60.0, max_devices=2)
+    assert get_delays(rate_limiter, 'ab') == [0.0, 0.0]
+
+    # Pushing to `a` makes it the most recently used, so `c` evicts `b`.
+    assert get_delays(rate_limiter, 'a') == [60.0]
+    assert get_delays(rate_limiter, 'c') == [0.0]
+    assert get_delays(rate_limiter, 'b') == [0.0]
+    assert get_delays(rate_limiter, 'c') == [60.0]
+
+
+def test_coalesce(clock):
+    rate_limiter = RateLimiter(device_limit=1, device_window=60.0, mode=RateLimiter.MODE_COALESCE)
+    rate_limiter.reserve('a')
+    delay, older_ticket = rate_limiter.reserve('a')
+    assert delay == 60.0
+    assert not rate_limiter.is_superseded('a', older_ticket)
+
+    delay, newer_ticket = rate_limiter.reserve('a')
+    assert delay == 120.0
+    assert rate_limiter.is_superseded('a', older_ticket)
+    assert not rate_limiter.is_superseded('a', newer_ticket)
+
+
+def test_delay_mode_does_not_coalesce(clock):
+    rate_limiter = RateLimiter(device_limit=1, device_window=60.0)
+    _, ticket = rate_limiter.reserve('a')
+    rate_limiter.reserve('a')
+    assert not rate_limiter.is_superseded('a', ticket)
+
+
+def test_coalesce_releases_the_device_slot(clock):
+    rate_limiter = RateLimiter(device_limit=2, device_window=60.0, mode=RateLimiter.MODE_COALESCE)
+    assert get_delays(rate_limiter, 'aa') == [0.0, 0.0]
+    delay, ticket = rate_limiter.reserve('a')
+    assert delay == 60.0
+    assert get_delays(rate_limiter, 'a') == [60.0]
+
+    clock.now += 60.0
+    assert rate_limiter.is_superseded('a', ticket)
+    # Without the release, the window would still hold two pushes at this time.
+    assert get_delays(rate_limiter, 'a') == [0.0]
+
+
+def test_coalesce_releases_the_global_slot(clock):
+    rate_limiter = RateLimiter(rate=1, burst=1, device_limit=10, mode=RateLimiter.MODE_COALESCE)
+    assert get_delays(rate_limiter, 'a') == [0.0]
+    delay, ticket = rate_limiter.reserve('a')
+    assert delay == pytest.approx(1.0)
+    assert get_delays(rate_limiter, 'a') == pytest.approx([2.0])
+
+    assert rate_limiter.is_superseded('a', ticket)
+    assert get_delays(rate_limiter, 'b') == pytest.approx([2.0])
+
+
+def test_penalize(clock):
+    rate_limiter = RateLimiter(device_limit=5, device_window=60.0)
+    assert get_delays(rate_limiter, 'a') == [0.0]
+    rate_limiter.penalize('a')
+    assert get_delays(rate_limiter, 'ab') == [60.0, 0.0]
+
+    clock.now += 60.0
+    assert get_delays(rate_limiter, 'a') == [0.0]
+
+
+def test_penalize_without_device_limit(clock):
+    rate_limiter = RateLimiter(rate=10)
+    rate_limiter.penalize('a')
+    assert get_delays(rate_limiter, 'a') == [0.0]
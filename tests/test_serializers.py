@@ -0,0 +1,92 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import uuid
+
+import pytest
+
+from pyapns_client import IOSPayload, IOSPayloadAlert, JSONSerializer, OrjsonSerializer, get_serializer, set_serializer
+
+pytest.importorskip('orjson')
+
+
+class Color(enum.Enum):
+    RED = 'red'
+
+
+class Size(enum.IntEnum):
+    SMALL = 1
+
+
+class Tag(str):
+    pass
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+    y: int
+
+
+VALUES = [
+    {'aps': {'alert': {'title': 'Hello', 'body': 'World'}, 'badge': 1, 'sound': 'default'}, 'id': 12345, 'tags': ['a', 'b']},
+    {'text': 'Hi "Bob" é\U0001f600 \x7f \n\t\\ </script>'},
+    {'floats': [0.0, -0.0, 1.5, 1e-07, 1e16, 1.7976931348623157e308, 5e-324, 0.1 + 0.2, 123456789.123]},
+    {'ints': [0, -1, 2 ** 63 - 1, -2 ** 63, 2 ** 64, -2 ** 100]},
+    {'special': [float('nan'), float('inf'), float('-inf')]},
+    {'nested': [[], {}, [[{'a': (1, 2)}]], None, True, False]},
+    {'z': 1, 'a': 2, 'm': {'y': 1, 'b': 2}},
+    {1: 'a', 2: 'b'},
+    {'date': datetime.date(2020, 1, 1)},
+    {'datetime': datetime.datetime(2020, 1, 1, 12, 30, tzinfo=datetime.timezone.utc)},
+    {'time': datetime.time(12, 30)},
+    {'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    {'enum': Color.RED},
+    {'int_enum': Size.SMALL},
+    {'str_subclass': Tag('tag')},
+    {'dataclass': Point(1, 2)},
+    {'decimal': decimal.Decimal('1.5')},
+    {'bytes': b'abc'},
+    {'set': {1}},
+]
+
+
+def encode(serializer, value, default=None):
+    try:
+        return serializer.dumps(value, default=default)
+    except (TypeError, ValueError) as e:
+        return type(e)
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_dumps_is_byte_identical(value):
+    assert encode(OrjsonSerializer(), value) == encode(JSONSerializer(), value)
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_dumps_is_byte_identical_with_default(value):
+    assert encode(OrjsonSerializer(), value, default=repr) == encode(JSONSerializer(), value, default=repr)
+
+
+@pytest.mark.parametrize('custom', [
+    {'d': datetime.date(2020, 1, 1)},
+    {'id': uuid.UUID('12345678-1234-5678-1234-567812345678')},
+    {'color': Color.RED},
+    {'point': Point(1, 2)},
+    {'name': 'é' * 3000},
+])
+def test_payload_to_json_is_byte_identical(custom):
+    payload = IOSPayload(alert=IOSPayloadAlert(title='Hello', body='Lorem ipsum dolor sit amet. ' * 200), badge=1, custom=custom)
+    serializer = get_serializer()
+    outputs = []
+    try:
+        for payload_serializer in (JSONSerializer(), OrjsonSerializer()):
+            set_serializer(payload_serializer)
+            try:
+                outputs.append(payload.to_json(max_size=4096))
+            except TypeError as e:
+                outputs.append(type(e))
+    finally:
+        set_serializer(serializer)
+    assert outputs[0] == outputs[1]